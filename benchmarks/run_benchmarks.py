@@ -0,0 +1,336 @@
+"""
+Offline benchmark suite for the scanning, prompt, parsing and scoring hot paths.
+
+Builds synthetic codebases of every requested size, times each stage (median of several repeats, with
+memoization caches cleared so every repeat does the full work), measures peak memory with tracemalloc
+in a separate run, and compares the medians against a stored baseline.
+
+    python -m benchmarks.run_benchmarks --sizes 10,100,1000
+    python -m benchmarks.run_benchmarks --save-baseline
+    python -m benchmarks.run_benchmarks --check      # exits with 1 when a benchmark is slower than the baseline allows
+    python -m benchmarks.run_benchmarks --verify     # checks the Myers diff and the section parser, exits with 1 on failures
+"""
+import argparse
+import contextlib
+import difflib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from config.constants import (BENCHMARK_RESULTS_PATH, BENCHMARK_BASELINE_PATH, BENCHMARK_SIZES, BENCHMARK_REPEATS,
+                              BENCHMARK_REGRESSION_RATIO, SIMILARITY_MAX_DIFF_COST)
+from benchmarks.synthetic import app_build_file, build_codebase, model_response, perturb, settings_file
+from evaluators.artifact_scoring import calculate_bleu_score, calculate_similarity_ratio, extract_dependencies
+from evaluators.bleu import reference_index
+from evaluators.gradle_parser import parse_gradle_build
+from evaluators.response_parser import MarkerStreamParser, parse_sections
+from evaluators.similarity import matching_blocks, similarity_ratio
+from prompts.context_packer import pack_codebase_context
+from prompts.system_prompt_generator import render_prompt
+from util.folder_helper import iter_relevant_files
+
+STREAM_CHUNK_SIZE = 64
+
+# Slowdowns smaller than this are timer noise and never count as regressions
+NOISE_FLOOR_SECONDS = 0.001
+
+# Diff settings checked by --verify: the greedy search, the linear-space search alone, and the linear-space search
+# with a cost cap small enough that random inputs exceed it
+VERIFY_DIFF_OPTIONS = {
+    "greedy": {},
+    "linear-space": {"greedy_max_d": 0},
+    "cost-capped": {"greedy_max_d": 0, "max_cost": 2},
+}
+
+
+def clear_caches():
+    parse_gradle_build.cache_clear()
+    reference_index.cache_clear()
+
+
+def measure(function, repeats, setup=None):
+    """Returns (median seconds, min seconds, peak traced bytes); stdout of the benchmarked code is discarded."""
+    durations = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - started)
+
+        # Peak memory is taken in an extra run, tracemalloc slows the timed ones down
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return statistics.median(durations), min(durations), peak
+
+
+def scoring_inputs(size, seed=0):
+    """Golden/generated build files whose dependency count grows with the codebase size (12 to 500)."""
+    rng = random.Random(seed)
+    golden = app_build_file(rng, max(12, min(500, size // 10)))
+    return golden, perturb(rng, golden)
+
+
+def benchmark_size(size, workdir, repeats):
+    """Runs every benchmark for one codebase size and returns {name: result}."""
+    codebase = build_codebase(os.path.join(workdir, f"case_{size}"), size)
+    index_dir = os.path.join(workdir, f"index_{size}")
+    codebase_bytes = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(codebase) for f in files)
+
+    def fresh_index():
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    def build_prompt():
+        """The prompt path of build_case_prompt: scan with a warm index, pack into the token budget, render."""
+        pieces, _ = pack_codebase_context(codebase, index_dir=index_dir)
+        return render_prompt(pieces)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        prompt_length = len(build_prompt())
+    response = model_response(random.Random(size), max(12, min(500, size // 10)))
+    golden, generated = scoring_inputs(size)
+
+    def stream_markers():
+        parser = MarkerStreamParser()
+        for i in range(0, len(response), STREAM_CHUNK_SIZE):
+            parser.feed(response[i:i + STREAM_CHUNK_SIZE])
+        parser.finish()
+
+    # name: (function, setup, amount of work, unit)
+    benchmarks = {
+        "scan_cold": (lambda: list(iter_relevant_files(codebase, index_dir)), fresh_index, size, "files"),
+        "scan_warm": (lambda: list(iter_relevant_files(codebase, index_dir)), None, size, "files"),
+        "prompt": (build_prompt, None, prompt_length, "chars"),
+        "markers": (lambda: parse_sections(response), None, len(response), "chars"),
+        "markers_stream": (stream_markers, None, len(response), "chars"),
+        "similarity": (lambda: calculate_similarity_ratio(golden, generated), None, len(golden), "chars"),
+        "bleu": (lambda: calculate_bleu_score(golden, generated), clear_caches, len(golden), "chars"),
+        "dependencies": (lambda: extract_dependencies(golden) | extract_dependencies(generated), clear_caches, len(golden) + len(generated), "chars"),
+    }
+
+    results = {}
+    for name, (function, setup, amount, unit) in benchmarks.items():
+        median, fastest, peak = measure(function, repeats, setup)
+        results[f"{name}[{size}]"] = {
+            "median_s": median,
+            "min_s": fastest,
+            "throughput": amount / median if median else None,
+            "unit": f"{unit}/s",
+            "peak_kib": peak / 1024,
+        }
+    results[f"scan_cold[{size}]"]["bytes"] = codebase_bytes
+    return results
+
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, repeats=BENCHMARK_REPEATS):
+    workdir = tempfile.mkdtemp(prefix="kmpeval-bench-")
+    try:
+        results = {}
+        for size in sizes:
+            print(f"⏱️ Benchmarking synthetic codebase with {size} file(s)...")
+            results.update(benchmark_size(size, workdir, repeats))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {"timestamp": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+                 "sizes": list(sizes), "repeats": repeats},
+        "results": results,
+    }
+
+
+def lcs_length(a, b):
+    """Brute-force longest common subsequence length, the reference the Myers matching must reach."""
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def edited(rng, sequence, alphabet, edits):
+    """A copy of sequence with a few random insertions, deletions and replacements."""
+    result = list(sequence)
+    for _ in range(edits):
+        position = rng.randint(0, len(result))
+        operation = rng.choice(("insert", "delete", "replace")) if position < len(result) else "insert"
+        if operation == "insert":
+            result.insert(position, rng.choice(alphabet))
+        elif operation == "delete":
+            del result[position]
+        else:
+            result[position] = rng.choice(alphabet)
+    return result
+
+
+def verify_similarity(cases=500, seed=0):
+    """Checks the Myers matching on random sequences and the char-mode ratio on perturbed synthetic build files.
+
+    Every diff setting of VERIFY_DIFF_OPTIONS must return valid blocks (in bounds, in order, equal elements), and the
+    exact LCS, never below difflib, wherever the inputs differ in at most twice its cost cap. Half of the sequence
+    pairs are a few edits apart, so the capped search also meets inputs it must diff exactly. The char ratio must
+    never be below the difflib ratio. Returns the number of failures.
+    """
+    rng = random.Random(seed)
+    failures = 0
+    for case in range(cases):
+        alphabet = "ab" if case % 2 else "abcdefgh"
+        a = [rng.choice(alphabet) for _ in range(rng.randint(0, 40))]
+        if case % 4 < 2:
+            b = [rng.choice(alphabet) for _ in range(rng.randint(0, 40))]
+        else:
+            b = edited(rng, a, alphabet, rng.randint(1, 4))
+        lcs = lcs_length(a, b)
+        difflib_matches = sum(block.size for block in difflib.SequenceMatcher(None, a, b, autojunk=False).get_matching_blocks())
+
+        for name, options in VERIFY_DIFF_OPTIONS.items():
+            blocks = matching_blocks(a, b, **options)
+            matches = sum(size for _, _, size in blocks)
+            in_bounds = all(i + size <= len(a) and j + size <= len(b) for i, j, size in blocks)
+            in_order = all(i1 + s1 <= i2 and j1 + s1 <= j2 for (i1, j1, s1), (i2, j2, _) in zip(blocks, blocks[1:]))
+            equal = all(a[i:i + size] == b[j:j + size] for i, j, size in blocks)
+            exact = len(a) + len(b) - 2 * lcs <= 2 * options.get("max_cost", SIMILARITY_MAX_DIFF_COST)
+            if not (in_bounds and in_order and equal) or (exact and (matches != lcs or matches < difflib_matches)):
+                failures += 1
+                print(f"❌ {name} Myers matching is wrong for {''.join(a)!r} vs {''.join(b)!r}")
+
+    for case in range(max(1, cases // 50)):
+        golden = app_build_file(rng, rng.randint(5, 30))
+        generated = perturb(rng, golden)
+        ratio, expected = similarity_ratio(golden, generated, "char"), similarity_ratio(golden, generated, "difflib")
+        if ratio + 1e-9 < expected:
+            failures += 1
+            print(f"❌ Char ratio {ratio:.4f} below the difflib ratio {expected:.4f} on synthetic build file {case}")
+
+    print(f"{'✅' if not failures else '❌'} Similarity verification: {failures} failure(s) in {cases} random case(s) with "
+          f"{len(VERIFY_DIFF_OPTIONS)} diff setting(s) and {max(1, cases // 50)} build file case(s)")
+    return failures
+
+
+def verify_markers(chunk_sizes=(1, 7, STREAM_CHUNK_SIZE)):
+    """Checks that every section is extracted, whole and streamed, also when END markers are missing.
+
+    Returns the number of failures.
+    """
+    sections = {
+        "ROOT_BUILD": "plugins {\n    alias(libs.plugins.kotlinMultiplatform) apply false\n}",
+        "APP_BUILD": app_build_file(random.Random(0), 12).strip(),
+        "SETTINGS": settings_file().strip(),
+        "GRADLEW": "@rem Gradle startup script for Windows",
+    }
+    failures = 0
+    for missing_end in [None, *sections, "all"]:
+        response = "Here are the files.\n\n" + "\n\n".join(
+            f"[{name}_START]\n{content}\n" + ("" if missing_end in (name, "all") else f"[{name}_END]")
+            for name, content in sections.items())
+        for chunk_size in (None, *chunk_sizes):
+            if chunk_size is None:
+                parsed = parse_sections(response)
+            else:
+                parser = MarkerStreamParser()
+                for i in range(0, len(response), chunk_size):
+                    parser.feed(response[i:i + chunk_size])
+                parser.finish()
+                parsed = parser.sections
+            if parsed != sections:
+                failures += 1
+                print(f"❌ Sections {sorted(parsed)} parsed wrong without the {missing_end} END marker"
+                      f"{f' in {chunk_size}-char chunks' if chunk_size else ''}")
+
+    print(f"{'✅' if not failures else '❌'} Section parser verification: {failures} failure(s)")
+    return failures
+
+
+def save_results(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    return path
+
+
+def load_baseline(path=BENCHMARK_BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_to_baseline(report, baseline, max_ratio=BENCHMARK_REGRESSION_RATIO):
+    """Prints every benchmark with its ratio to the baseline median and returns the names slower than max_ratio."""
+    baseline_results = baseline["results"] if baseline else {}
+    regressions = []
+
+    print(f"\n{'benchmark':<24}  {'median ms':>10}  {'throughput':>18}  {'peak KiB':>9}  {'vs base':>8}")
+    for name, result in report["results"].items():
+        throughput = f"{result['throughput']:,.0f} {result['unit']}" if result["throughput"] else "-"
+        ratio_text = "-"
+        base = baseline_results.get(name)
+        if base:
+            ratio = result["median_s"] / base["median_s"] if base["median_s"] else 1.0
+            ratio_text = f"{ratio:.2f}x"
+            if ratio > max_ratio and result["median_s"] - base["median_s"] > NOISE_FLOOR_SECONDS:
+                ratio_text += " ❌"
+                regressions.append(name)
+        print(f"{name:<24}  {result['median_s'] * 1000:>10.3f}  {throughput:>18}  {result['peak_kib']:>9.1f}  {ratio_text:>8}")
+
+    if baseline is None:
+        print("\nℹ️ No baseline stored yet, run with --save-baseline")
+    elif regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) more than {max_ratio}x slower than the baseline")
+    else:
+        print("\n✅ No benchmark regressions against the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the KMPEval hot paths")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in BENCHMARK_SIZES),
+                        help="Comma-separated synthetic codebase sizes in files (10 to 10000)")
+    parser.add_argument("--repeats", type=int, default=BENCHMARK_REPEATS, help="Timed repeats per benchmark")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="Baseline results file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with 1 when a benchmark regressed against the baseline")
+    parser.add_argument("--verify", action="store_true",
+                        help="Only check the similarity engine against brute-force LCS and difflib and the section parser "
+                             "on responses with missing END markers, exit with 1 on failures")
+    args = parser.parse_args()
+
+    if args.verify:
+        failures = verify_similarity() + verify_markers()
+        sys.exit(1 if failures else 0)
+
+    report = run_benchmarks([int(size) for size in args.sizes.split(",")], args.repeats)
+
+    path = save_results(report, os.path.join(BENCHMARK_RESULTS_PATH, time.strftime("%Y%m%dT%H%M%S") + ".json"))
+    print(f"🗄️ Benchmark results written to {path}")
+
+    regressions = compare_to_baseline(report, load_baseline(args.baseline))
+
+    if args.save_baseline:
+        save_results(report, args.baseline)
+        print(f"📌 Baseline updated: {args.baseline}")
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Deterministic synthetic KMP codebases and model responses for the benchmark suite.
+
+Everything is generated from a seed, so the same size always produces byte-identical inputs.
+"""
+import os
+import random
+
+LIBRARIES = [
+    ("androidx-activity-compose", "androidx.activity:activity-compose", "1.9.0"),
+    ("androidx-lifecycle-viewmodel", "org.jetbrains.androidx.lifecycle:lifecycle-viewmodel", "2.8.0"),
+    ("ktor-client-core", "io.ktor:ktor-client-core", "2.3.12"),
+    ("ktor-client-okhttp", "io.ktor:ktor-client-okhttp", "2.3.12"),
+    ("ktor-client-darwin", "io.ktor:ktor-client-darwin", "2.3.12"),
+    ("kotlinx-coroutines-core", "org.jetbrains.kotlinx:kotlinx-coroutines-core", "1.8.1"),
+    ("kotlinx-serialization-json", "org.jetbrains.kotlinx:kotlinx-serialization-json", "1.7.1"),
+    ("koin-core", "io.insert-koin:koin-core", "3.5.6"),
+    ("sqldelight-runtime", "app.cash.sqldelight:runtime", "2.0.2"),
+    ("napier", "io.github.aakira:napier", "2.7.1"),
+    ("kotlin-test", "org.jetbrains.kotlin:kotlin-test", "2.0.0"),
+    ("junit", "junit:junit", "4.13.2"),
+]
+
+SOURCE_SETS = ["commonMain", "androidMain", "iosMain", "commonTest", "androidUnitTest"]
+
+# Share of generated files per kind: Kotlin sources dominate real projects, with resources and a few binaries
+FILE_KINDS = [("kotlin", 0.75), ("resource", 0.15), ("text", 0.05), ("binary", 0.05)]
+
+
+def _kotlin_file(rng, package, name):
+    imports = rng.sample(["kotlinx.coroutines.flow.Flow", "kotlinx.coroutines.launch", "io.ktor.client.HttpClient",
+                          "androidx.compose.runtime.Composable", "androidx.compose.material3.Text",
+                          "kotlinx.serialization.Serializable", "org.koin.core.component.KoinComponent"], 3)
+    lines = [f"package {package}", ""] + [f"import {i}" for i in imports] + [""]
+    lines.append(f"class {name}(private val id: Int) {{")
+    for method in range(rng.randint(3, 12)):
+        lines.append(f"    fun compute{method}(input: List<Int>): Int {{")
+        lines.append(f"        return input.filter {{ it % {method + 2} == 0 }}.sumOf {{ it * id }}")
+        lines.append("    }")
+        lines.append("")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _resource_file(rng, name):
+    strings = "\n".join(f'    <string name="{name}_{i}">Value {rng.randint(0, 10 ** 6)}</string>' for i in range(rng.randint(5, 40)))
+    return f'<?xml version="1.0" encoding="utf-8"?>\n<resources>\n{strings}\n</resources>\n'
+
+
+def version_catalog():
+    lines = ["[versions]", 'agp = "8.5.2"', 'kotlin = "2.0.0"', "", "[libraries]"]
+    for alias, module, version in LIBRARIES:
+        lines.append(f'{alias} = {{ module = "{module}", version = "{version}" }}')
+    lines += ["", "[plugins]", 'androidApplication = { id = "com.android.application", version.ref = "agp" }',
+              'kotlinMultiplatform = { id = "org.jetbrains.kotlin.multiplatform", version.ref = "kotlin" }']
+    return "\n".join(lines) + "\n"
+
+
+def app_build_file(rng, dependency_count=len(LIBRARIES)):
+    """A composeApp/build.gradle.kts with catalog, coordinate and compose dependencies spread over source sets."""
+    lines = ["plugins {", "    alias(libs.plugins.kotlinMultiplatform)", "    alias(libs.plugins.androidApplication)", "}", "",
+             "kotlin {", "    androidTarget()", "    iosArm64()", "", "    sourceSets {"]
+    libraries = [LIBRARIES[i % len(LIBRARIES)] for i in range(dependency_count)]
+    for source_set in SOURCE_SETS:
+        lines.append(f"        {source_set}.dependencies {{")
+        for alias, module, version in libraries:
+            if rng.random() < 0.5:
+                lines.append(f"            implementation(libs.{alias.replace('-', '.')})")
+            elif rng.random() < 0.5:
+                lines.append(f'            implementation("{module}:{version}")')
+        lines.append("            implementation(compose.runtime)")
+        lines.append("        }")
+    lines += ["    }", "}", "", "android {", '    namespace = "org.example.bench"', "    compileSdk = 34", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def settings_file():
+    return ('rootProject.name = "Bench"\n\npluginManagement {\n    repositories {\n        google()\n        mavenCentral()\n    }\n}\n\n'
+            'include(":composeApp")\n')
+
+
+def perturb(rng, content, rate=0.1):
+    """A plausible generated variant of a golden file: some lines dropped, some edited, some swapped."""
+    lines = content.splitlines()
+    result = []
+    for line in lines:
+        roll = rng.random()
+        if roll < rate / 2:
+            continue
+        if roll < rate:
+            line = line.replace("implementation", "api")
+        result.append(line)
+    for _ in range(int(len(result) * rate / 2)):
+        i = rng.randrange(len(result))
+        j = rng.randrange(len(result))
+        result[i], result[j] = result[j], result[i]
+    return "\n".join(result) + "\n"
+
+
+def model_response(rng, dependency_count=len(LIBRARIES)):
+    """A complete marked model response, as returned by the API."""
+    sections = {
+        "ROOT_BUILD": "plugins {\n    alias(libs.plugins.androidApplication) apply false\n    alias(libs.plugins.kotlinMultiplatform) apply false\n}\n",
+        "APP_BUILD": app_build_file(rng, dependency_count),
+        "SETTINGS": settings_file(),
+        "GRADLEW": "@rem Gradle startup script for Windows\n@if \"%DEBUG%\"==\"\" @echo off\n" * 20,
+    }
+    return "Here are the files.\n\n" + "\n\n".join(f"[{name}_START]\n{content}[{name}_END]" for name, content in sections.items())
+
+
+def build_codebase(root, file_count, seed=0):
+    """Writes a synthetic KMP project with file_count files under root/input_codebase and returns its path."""
+    rng = random.Random(seed)
+    codebase = os.path.join(root, "input_codebase")
+
+    fixed = {
+        "build.gradle.kts": "plugins {\n    alias(libs.plugins.kotlinMultiplatform) apply false\n}\n",
+        "settings.gradle.kts": settings_file(),
+        "gradle/libs.versions.toml": version_catalog(),
+        "composeApp/build.gradle.kts": app_build_file(rng),
+    }
+    files = dict(list(fixed.items())[:max(1, min(len(fixed), file_count))])
+
+    kinds = [kind for kind, _ in FILE_KINDS]
+    weights = [weight for _, weight in FILE_KINDS]
+    while len(files) < file_count:
+        index = len(files)
+        kind = rng.choices(kinds, weights)[0]
+        source_set = rng.choice(SOURCE_SETS)
+        package = f"org.example.bench.feature{index % 50}"
+        if kind == "kotlin":
+            name = f"Feature{index}"
+            path = f"composeApp/src/{source_set}/kotlin/{package.replace('.', '/')}/{name}.kt"
+            files[path] = _kotlin_file(rng, package, name)
+        elif kind == "resource":
+            files[f"composeApp/src/androidMain/res/values-v{index}/strings.xml"] = _resource_file(rng, f"s{index}")
+        elif kind == "text":
+            files[f"composeApp/src/{source_set}/notes/NOTES_{index}.md"] = f"# Notes {index}\n\n" + "Lorem ipsum dolor sit amet.\n" * rng.randint(5, 50)
+        else:
+            files[f"composeApp/src/androidMain/assets/blob_{index}.dat"] = bytes(rng.getrandbits(8) for _ in range(512)) + b"\0"
+
+    for relative_path, content in files.items():
+        path = os.path.join(codebase, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(content, bytes):
+            with open(path, "wb") as f:
+                f.write(content)
+        else:
+            with open(path, "w", encoding="utf-8", newline="\n") as f:
+                f.write(content)
+
+    return codebase
@@ -6,6 +6,116 @@ MODEL_NAME = "claude-3-5-sonnet-20241022"
 MAX_TOKENS = 3000
 TEMPERATURE = 0.7
 
-GOLDEN_DATASET_PATH = "golden_dataset\\KMPWithTests"
-GENERATED_OUTPUT_PATH = "golden_dataset\\KMPWithTests\\generated"
+# Default case of the single-case commands (main.py generate/score/validate/assemble without --case)
+GOLDEN_DATASET_PATH = os.path.join("golden_dataset", "KMPWithTests")
+GENERATED_OUTPUT_PATH = os.path.join(GOLDEN_DATASET_PATH, "generated")
 
+# Multi-case evaluation
+DATASET_ROOT_PATH = "golden_dataset"
+MAX_PARALLEL_CASES = 8
+MAX_INFLIGHT_REQUESTS = 4
+
+# Sharded runs: queue folder on storage shared by all workers (one per run). Workers refresh the claims of the cases
+# they are working on every heartbeat; a claim not refreshed for the timeout belongs to a dead worker
+SHARD_QUEUE_PATH = os.environ.get("KMPEVAL_SHARD_QUEUE", os.path.join(".cache", "shard_queue"))
+SHARD_HEARTBEAT_SECONDS = 60
+SHARD_CLAIM_TIMEOUT_SECONDS = 15 * 60
+
+# Model response cache: "read-through", "refresh" (always call the model and overwrite),
+# "offline" (replay only, never call the model) or "off"
+RESPONSE_CACHE_PATH = os.path.join(".cache", "responses")
+RESPONSE_CACHE_MODE = os.environ.get("KMPEVAL_CACHE_MODE", "read-through")
+RESPONSE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+RESPONSE_CACHE_MAX_AGE_DAYS = 30
+
+# Persistent index of scanned input codebases
+FILE_INDEX_PATH = os.path.join(".cache", "file_index")
+
+# Memory bounds for scanned sources: text kept per file, and per generated source (generated/ folders, lock files,
+# files with a generated-code header); longer files are truncated with a note in the prompt
+MAX_SOURCE_FILE_BYTES = int(os.environ.get("KMPEVAL_MAX_SOURCE_FILE_BYTES", 256 * 1024))
+GENERATED_SOURCE_MAX_BYTES = 4 * 1024
+
+# Context packing: token budget for the source files embedded into the prompt
+CONTEXT_TOKEN_BUDGET = 120000
+CONTEXT_SUMMARIZE_LOW_PRIORITY = True
+
+# Mark the stable prompt prefix (instructions and codebase) for the API's prompt caching, so samples and retries
+# of a case read it from the cache instead of paying full input tokens
+PROMPT_CACHING = os.environ.get("KMPEVAL_PROMPT_CACHING", "1") == "1"
+
+# Stream model responses and write each section as soon as it is complete
+STREAM_RESPONSES = os.environ.get("KMPEVAL_STREAM", "0") == "1"
+
+# Message Batches mode
+BATCH_STATE_PATH = os.path.join(".cache", "batches", "current_batch.json")
+BATCH_POLL_INITIAL_SECONDS = 10
+BATCH_POLL_MAX_SECONDS = 300
+BATCH_MAX_WAIT_SECONDS = 24 * 60 * 60
+
+# API client retries and adaptive concurrency
+API_MAX_RETRIES = 6
+API_RETRY_BASE_SECONDS = 1.0
+API_RETRY_MAX_SECONDS = 60.0
+API_TIMEOUT_SECONDS = 600.0
+
+# Similarity engine mode: "difflib", "char", "token", "line" or "ngram" (see evaluators/similarity.py)
+SIMILARITY_MODE = "token"
+# Myers diff: files that differ in at most SIMILARITY_GREEDY_MAX_DIFF elements get the fast greedy search, whose
+# trace grows with the square of the difference. Larger differences use the linear-space search, where a
+# subproblem that needs more than SIMILARITY_MAX_DIFF_COST steps is split at its furthest-reaching path instead
+# (GNU diff's heuristic). That bounds time on unrelated inputs, at the cost of an optimal matching
+SIMILARITY_GREEDY_MAX_DIFF = 2048
+SIMILARITY_MAX_DIFF_COST = 256
+
+# BLEU: maximum n-gram order and smoothing ("add-one", "epsilon" or "none")
+BLEU_MAX_ORDER = 4
+BLEU_SMOOTHING = "add-one"
+
+# Gradle assembly of generated projects
+ASSEMBLY_WORKSPACE_PATH = os.path.join(".cache", "workspaces")
+ASSEMBLY_GRADLE_USER_HOME = os.environ.get("KMPEVAL_GRADLE_USER_HOME", os.path.join(".cache", "gradle-home"))
+ASSEMBLY_TASK = ":composeApp:assembleDebug"
+ASSEMBLY_MAX_PARALLEL_BUILDS = 2
+ASSEMBLY_TIMEOUT_SECONDS = 900
+
+# Multi-sample generation (pass@k)
+SAMPLES_PER_CASE = 5
+
+# Per-artifact scoring: weight of every generated file in the case score, and metric weights per artifact kind
+ARTIFACT_WEIGHTS = {
+    "build.gradle.kts": 0.3,
+    "composeApp/build.gradle.kts": 0.4,
+    "settings.gradle.kts": 0.2,
+    "gradlew.bat": 0.1,
+}
+ARTIFACT_METRIC_WEIGHTS = {
+    "build": {"similarity": 0.25, "bleu": 0.25, "dependency_f1": 0.5},
+    "settings": {"similarity": 0.3, "bleu": 0.2, "module_f1": 0.5},
+    "script": {"similarity": 1.0},
+}
+SCORING_MAX_WORKERS = os.cpu_count() or 1
+# Golden and generated files are scored and validated on at most this many bytes, which bounds diff and n-gram memory
+SCORING_MAX_FILE_BYTES = 1024 * 1024
+
+# Results store (SQLite) and run-over-run regression check
+RESULTS_DB_PATH = os.environ.get("KMPEVAL_RESULTS_DB", os.path.join("results", "kmpeval.sqlite"))
+REGRESSION_ALPHA = 0.05
+REGRESSION_MIN_DELTA = 0.01
+
+# Instrumentation: JSON trace of stage spans, and stages to profile ("scan,api,metrics") with cProfile or pyinstrument
+TRACE_PATH = os.environ.get("KMPEVAL_TRACE", os.path.join(".cache", "traces", "latest.json"))
+PROFILE_STAGES = [stage for stage in os.environ.get("KMPEVAL_PROFILE", "").split(",") if stage]
+PROFILER = os.environ.get("KMPEVAL_PROFILER", "cprofile")
+
+# Offline benchmark suite (benchmarks/run_benchmarks.py)
+BENCHMARK_RESULTS_PATH = os.path.join(".cache", "benchmarks")
+BENCHMARK_BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+BENCHMARK_SIZES = [10, 100, 1000]
+BENCHMARK_REPEATS = 5
+BENCHMARK_REGRESSION_RATIO = 1.5
+
+# Model backend: "live" (Anthropic API), "record" (live + write request/response pairs) or "replay" (offline)
+MODEL_BACKEND = os.environ.get("KMPEVAL_BACKEND", "live")
+RECORDINGS_PATH = os.environ.get("KMPEVAL_RECORDINGS", "recordings")
+REPLAY_LATENCY_SECONDS = float(os.environ.get("KMPEVAL_REPLAY_LATENCY", "0"))
@@ -0,0 +1,328 @@
+"""
+Per-artifact scoring matrix: every file the prompt asks for is compared against its golden counterpart with
+a metric set of its own kind, combined into a weighted artifact score and a weighted case score.
+
+Artifacts of many cases are scored in one process pool, since the diff and BLEU metrics are CPU-bound.
+"""
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from config.constants import ARTIFACT_WEIGHTS, ARTIFACT_METRIC_WEIGHTS, SCORING_MAX_WORKERS, SCORING_MAX_FILE_BYTES, SIMILARITY_MODE
+from evaluators.bleu import score_candidates, sentence_bleu
+from evaluators.gradle_parser import dependencies_by_source_set, load_version_catalog, parse_gradle_build, resolve_catalog
+from evaluators.response_parser import SECTION_FILES
+from evaluators.similarity import diff_sequences, ngram_similarity_matrix, similarity_ratio, unified_diff_lines
+from evaluators.static_validator import file_role
+from util.file_index import read_text_file
+from util.instrumentation import record_span, span
+
+# Every section the prompt asks for, scored by the metric set of its kind
+ARTIFACT_KINDS = {
+    "build.gradle.kts": "build",
+    "composeApp/build.gradle.kts": "build",
+    "settings.gradle.kts": "settings",
+    "gradlew.bat": "script",
+}
+ARTIFACTS = [path for path in SECTION_FILES.values() if path in ARTIFACT_KINDS]
+
+KEY_APP_DEPENDENCIES = ['io.ktor:ktor-client-core', 'compose.runtime', 'compose.foundation']
+
+INCLUDE_PATTERN = re.compile(r'\binclude\s*\(([^)]*)\)')
+STRING_PATTERN = re.compile(r'"([^"\n]*)"')
+ROOT_PROJECT_PATTERN = re.compile(r'rootProject\.name\s*=\s*"([^"\n]*)"')
+
+# Columns of the results table: (metric, header)
+TABLE_COLUMNS = [("score", "score"), ("similarity", "sim"), ("bleu", "bleu"), ("dependency_f1", "dep_f1"),
+                 ("module_f1", "mod_f1"), ("text_match", "match"), ("static_valid", "static"), ("compile_success", "build")]
+
+
+def calculate_bleu_score(reference, candidate):
+    """BLEU-4 with brevity penalty and smoothing over Gradle-aware tokens, see evaluators.bleu"""
+    return sentence_bleu(reference, candidate)
+
+
+def calculate_similarity_ratio(text1, text2, mode=SIMILARITY_MODE):
+    """Text similarity ratio, see evaluators.similarity for the available modes"""
+    return similarity_ratio(text1, text2, mode)
+
+
+def extract_dependencies(gradle_content, catalog=None):
+    """Extracts dependencies and plugins from build.gradle.kts, see evaluators.gradle_parser"""
+    return {dependency.notation for dependency in resolve_catalog(parse_gradle_build(gradle_content), catalog)}
+
+
+def extract_dependencies_by_source_set(gradle_content, catalog=None):
+    """Extracts dependencies grouped by source set (commonMain, androidMain, main, plugins, ...)"""
+    return dependencies_by_source_set(resolve_catalog(parse_gradle_build(gradle_content), catalog))
+
+
+def calculate_dependency_metrics(golden_deps, generated_deps):
+    """Calculates precision, recall, F1 for dependencies"""
+    if not golden_deps and not generated_deps:
+        return 1.0, 1.0, 1.0
+    if not generated_deps:
+        return 0.0, 0.0, 0.0
+    if not golden_deps:
+        return 0.0, 1.0, 0.0
+
+    intersection = golden_deps & generated_deps
+    precision = len(intersection) / len(generated_deps)
+    recall = len(intersection) / len(golden_deps)
+    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0.0
+
+    return precision, recall, f1
+
+
+@lru_cache(maxsize=256)
+def read_golden_file(path, mtime_ns):
+    return read_text_file(path, SCORING_MAX_FILE_BYTES)
+
+
+def text_metrics(golden_content, generated_content, mode=SIMILARITY_MODE, precomputed=None):
+    """Similarity, BLEU and line-diff match shared by all artifact kinds; the line diff is computed once.
+
+    precomputed holds metrics already computed for several candidates at once (see score_samples)."""
+    precomputed = precomputed or {}
+    golden_lines = golden_content.splitlines()
+    generated_lines = generated_content.splitlines()
+    line_ratio, line_opcodes = diff_sequences(golden_lines, generated_lines)
+
+    if mode == "line":
+        similarity = line_ratio
+    elif "similarity" in precomputed:
+        similarity = precomputed["similarity"]
+    else:
+        similarity = calculate_similarity_ratio(golden_content, generated_content, mode)
+    diff_length = sum(1 for _ in unified_diff_lines(golden_lines, generated_lines, line_opcodes))
+
+    return {
+        "similarity": similarity,
+        "bleu": precomputed["bleu"] if "bleu" in precomputed else calculate_bleu_score(golden_content, generated_content),
+        "text_match": max(0, 100 - diff_length * 2),
+    }
+
+
+def score_build_file(golden_content, generated_content, artifact, catalog, precomputed=None):
+    metrics = text_metrics(golden_content, generated_content, precomputed=precomputed)
+
+    # Aliases of both sides are resolved against the golden version catalog, if the case has one
+    golden_deps = extract_dependencies(golden_content, catalog)
+    generated_deps = extract_dependencies(generated_content, catalog)
+    precision, recall, f1 = calculate_dependency_metrics(golden_deps, generated_deps)
+    metrics["dependency_precision"] = precision
+    metrics["dependency_recall"] = recall
+    metrics["dependency_f1"] = f1
+
+    golden_by_set = extract_dependencies_by_source_set(golden_content, catalog)
+    generated_by_set = extract_dependencies_by_source_set(generated_content, catalog)
+    for source_set in sorted(set(golden_by_set) | set(generated_by_set)):
+        _, _, set_f1 = calculate_dependency_metrics(golden_by_set.get(source_set, set()), generated_by_set.get(source_set, set()))
+        metrics[f"dependency_f1[{source_set}]"] = set_f1
+
+    if artifact.startswith("composeApp/"):
+        found = [dep for dep in KEY_APP_DEPENDENCIES if dep in generated_content]
+        metrics["key_dependencies"] = len(found) / len(KEY_APP_DEPENDENCIES)
+
+    return metrics
+
+
+def settings_modules(content):
+    return {module for args in INCLUDE_PATTERN.findall(content) for module in STRING_PATTERN.findall(args)}
+
+
+def score_settings_file(golden_content, generated_content, precomputed=None):
+    metrics = text_metrics(golden_content, generated_content, precomputed=precomputed)
+
+    _, _, module_f1 = calculate_dependency_metrics(settings_modules(golden_content), settings_modules(generated_content))
+    metrics["module_f1"] = module_f1
+
+    golden_name = ROOT_PROJECT_PATTERN.search(golden_content)
+    generated_name = ROOT_PROJECT_PATTERN.search(generated_content)
+    metrics["root_project_match"] = 1.0 if golden_name and generated_name and golden_name.group(1) == generated_name.group(1) else 0.0
+
+    return metrics
+
+
+def score_script_file(golden_content, generated_content, precomputed=None):
+    return text_metrics(golden_content, generated_content, mode="line", precomputed=precomputed)
+
+
+def weighted_score(metrics, weights):
+    total = sum(weights.values())
+    if not total:
+        return 0.0
+    return sum(weight * metrics.get(name, 0.0) for name, weight in weights.items()) / total
+
+
+def golden_artifact_file(golden_path, artifact):
+    """Golden file of an artifact, or None if the case has none.
+
+    golden_output may keep the module build at the top level instead of a root build (see
+    static_validator.file_role); such a file is the golden composeApp/build.gradle.kts, not the root build.
+    """
+    golden_output = os.path.join(golden_path, "golden_output")
+    golden_file = os.path.join(golden_output, *artifact.split('/'))
+    top_level_build = os.path.join(golden_output, "build.gradle.kts")
+
+    if artifact not in ("build.gradle.kts", "composeApp/build.gradle.kts") or not os.path.exists(top_level_build):
+        return golden_file if os.path.exists(golden_file) else None
+    if artifact == "composeApp/build.gradle.kts" and os.path.exists(golden_file):
+        return golden_file
+
+    top_level_is_app = file_role("build.gradle.kts", read_golden_file(top_level_build, os.stat(top_level_build).st_mtime_ns)) == "app"
+    if artifact == "build.gradle.kts":
+        return None if top_level_is_app else top_level_build
+    return top_level_build if top_level_is_app else None
+
+
+def score_artifact(golden_path, generated_path, artifact, precomputed=None):
+    """Scores one artifact of a case. A case without a golden version of it gets {"no_golden": 1};
+    a missing generated file scores 0. precomputed holds text metrics computed in batch, see score_samples."""
+    golden_file = golden_artifact_file(golden_path, artifact)
+    generated_file = os.path.join(generated_path, *artifact.split('/'))
+
+    if golden_file is None:
+        return {"no_golden": 1.0}
+    if not os.path.exists(generated_file):
+        return {"score": 0.0, "missing": 1.0}
+
+    # Golden content is read once per file version and shared by all samples and models scored against it
+    golden_content = read_golden_file(golden_file, os.stat(golden_file).st_mtime_ns)
+    generated_content = read_text_file(generated_file, SCORING_MAX_FILE_BYTES)
+
+    kind = ARTIFACT_KINDS[artifact]
+    if kind == "build":
+        catalog = load_version_catalog(os.path.join(golden_path, "golden_output", "gradle", "libs.versions.toml"))
+        metrics = score_build_file(golden_content, generated_content, artifact, catalog, precomputed)
+    elif kind == "settings":
+        metrics = score_settings_file(golden_content, generated_content, precomputed)
+    else:
+        metrics = score_script_file(golden_content, generated_content, precomputed)
+
+    metrics["score"] = weighted_score(metrics, ARTIFACT_METRIC_WEIGHTS[kind])
+    return metrics
+
+
+def add_case_score(metrics):
+    """Adds the weighted case score over the scored artifacts; weights of artifacts without golden files are dropped."""
+    weights = {artifact: ARTIFACT_WEIGHTS.get(artifact, 0.0) for artifact in ARTIFACTS if "score" in metrics.get(artifact, {})}
+    metrics["overall"] = {"score": weighted_score({a: metrics[a]["score"] for a in weights}, weights)}
+    return metrics
+
+
+def score_case(golden_path, generated_path):
+    """Scores every artifact of one case in-process and returns {artifact: metrics, "overall": {"score"}}."""
+    metrics = {}
+    for artifact in ARTIFACTS:
+        with span("metrics", artifact=artifact):
+            metrics[artifact] = score_artifact(golden_path, generated_path, artifact)
+    return add_case_score(metrics)
+
+
+def score_samples(golden_path, generated_paths):
+    """Scores several generated outputs of one case (e.g. the k samples of pass@k) and returns one metrics dict per output.
+
+    The BLEU scores of each artifact are computed for all outputs in one score_candidates call, against a golden
+    reference index built once. In "ngram" similarity mode the similarities come from one ngram_similarity_matrix
+    call as well (hashed n-gram vectors with NumPy, see evaluators.similarity).
+    """
+    precomputed = {}
+    for artifact in ARTIFACTS:
+        golden_file = golden_artifact_file(golden_path, artifact)
+        if golden_file is None:
+            continue
+        present = [path for path in generated_paths if os.path.exists(os.path.join(path, *artifact.split('/')))]
+        golden_content = read_golden_file(golden_file, os.stat(golden_file).st_mtime_ns)
+        with span("metrics", artifact=artifact, candidates=len(present)):
+            candidates = [read_text_file(os.path.join(path, *artifact.split('/')), SCORING_MAX_FILE_BYTES) for path in present]
+            for path, score in zip(present, score_candidates(golden_content, candidates)):
+                precomputed[path, artifact] = {"bleu": score}
+            if SIMILARITY_MODE == "ngram" and ARTIFACT_KINDS[artifact] != "script":
+                for path, similarity in zip(present, ngram_similarity_matrix([golden_content], candidates)[0]):
+                    precomputed[path, artifact]["similarity"] = similarity
+
+    results = []
+    for path in generated_paths:
+        metrics = {}
+        for artifact in ARTIFACTS:
+            with span("metrics", artifact=artifact):
+                metrics[artifact] = score_artifact(golden_path, path, artifact, precomputed.get((path, artifact)))
+        results.append(add_case_score(metrics))
+    return results
+
+
+def _score_job(job):
+    # Timed in the worker process; the span is recorded by the parent
+    started = time.perf_counter()
+    metrics = score_artifact(*job)
+    return metrics, time.perf_counter() - started
+
+
+def score_matrix(cases, max_workers=None):
+    """Scores every artifact of every (golden_path, generated_path) case, fanned out over a process pool.
+
+    Returns one metrics dict per case, in the order of cases.
+    """
+    max_workers = max_workers or SCORING_MAX_WORKERS
+    jobs = [(golden_path, generated_path, artifact) for golden_path, generated_path in cases for artifact in ARTIFACTS]
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        scores = [_score_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            scores = list(pool.map(_score_job, jobs, chunksize=max(1, len(jobs) // (max_workers * 4))))
+
+    for (golden_path, _, artifact), (_, duration) in zip(jobs, scores):
+        record_span("metrics", duration, case=os.path.basename(os.path.normpath(golden_path)), artifact=artifact)
+
+    results = []
+    for i in range(len(cases)):
+        case_scores = scores[i * len(ARTIFACTS):(i + 1) * len(ARTIFACTS)]
+        metrics = {artifact: artifact_metrics for artifact, (artifact_metrics, _) in zip(ARTIFACTS, case_scores)}
+        results.append(add_case_score(metrics))
+    return results
+
+
+def _format_cell(metrics, name):
+    if name not in metrics:
+        return "-"
+    if name == "text_match":
+        return f"{metrics[name]:.0f}%"
+    return f"{metrics[name]:.3f}"
+
+
+def average_metrics(metrics_list):
+    """Averages (artifact, metric) values over several cases, for the summary row of the table."""
+    totals = {}
+    for metrics in metrics_list:
+        for artifact, artifact_metrics in metrics.items():
+            for name, value in artifact_metrics.items():
+                totals.setdefault(artifact, {}).setdefault(name, []).append(value)
+    return {artifact: {name: sum(values) / len(values) for name, values in names.items()} for artifact, names in totals.items()}
+
+
+def print_results_table(rows):
+    """Prints one compact table for (case, metrics) rows: a line per scored artifact and one per case."""
+    artifact_width = max(len(a) for a in ARTIFACTS) + len(" (no golden)")
+    case_width = max([len("case")] + [len(case) for case, _ in rows])
+
+    header = f"{'case':<{case_width}}  {'artifact':<{artifact_width}}" + "".join(f"  {title:>7}" for _, title in TABLE_COLUMNS)
+    print(header)
+    print("-" * len(header))
+
+    for case, metrics in rows:
+        for artifact in ARTIFACTS + ["overall"]:
+            if artifact not in metrics:
+                continue
+            artifact_metrics = metrics[artifact]
+            if "score" not in artifact_metrics:
+                label = f"{artifact} (no golden)"
+            elif artifact_metrics.get("missing"):
+                label = f"{artifact} (missing)"
+            else:
+                label = artifact
+            cells = "".join(f"  {_format_cell(artifact_metrics, name):>7}" for name, _ in TABLE_COLUMNS)
+            print(f"{case:<{case_width}}  {label:<{artifact_width}}{cells}")
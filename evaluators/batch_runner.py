@@ -0,0 +1,226 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config.constants import (MODEL_NAME, MAX_TOKENS, TEMPERATURE, DATASET_ROOT_PATH, RESPONSE_CACHE_MODE, MAX_INFLIGHT_REQUESTS,
+                              BATCH_STATE_PATH, BATCH_POLL_INITIAL_SECONDS, BATCH_POLL_MAX_SECONDS, BATCH_MAX_WAIT_SECONDS)
+from evaluators.corpus_runner import score_corpus, score_generated_case, print_corpus_report
+from evaluators.model_evaluator import build_case_prompt, build_request_params, parse_model_response, save_optional_sections
+from util.api_client import call_with_retries, get_shared_client
+from util.atomic_file import write_json_atomic
+from util.folder_helper import ensure_directory_exists, find_dataset_cases
+from util.instrumentation import count, finish_run, set_case
+from util.model_backends import AnthropicBackend, ReplayBackend, ReplayMissError, get_backend
+from util.response_cache import cache_key, load_cached_response, store_cached_response, evict_cache
+from util.results_store import record_run
+
+
+class AnthropicBatchTransport:
+    """Message Batches API transport.
+
+    Any object with the same submit/is_finished/results methods can be passed to run_batch instead,
+    e.g. ReplayBatchTransport for offline runs.
+    """
+
+    live = True
+
+    def __init__(self, client=None):
+        self.client = client or get_shared_client()
+
+    def submit(self, requests):
+        """Submits [{"custom_id", "params"}] requests as one batch and returns the batch id."""
+        return call_with_retries(lambda: self.client.messages.batches.create(requests=requests)).id
+
+    def is_finished(self, batch_id):
+        batch = call_with_retries(lambda: self.client.messages.batches.retrieve(batch_id))
+        return batch.processing_status == "ended"
+
+    def results(self, batch_id):
+        """Yields (custom_id, response text) pairs; text is None for errored, canceled or expired requests."""
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                text = "".join(block.text for block in entry.result.message.content if block.type == "text")
+                yield entry.custom_id, text
+            else:
+                yield entry.custom_id, None
+
+
+class ReplayBatchTransport:
+    """Offline batch transport: answers every request of a batch from a replay backend when it is submitted.
+
+    Used by run_batch with --backend replay, so batch runs work without network or API key. Its batches only live
+    in this process; they are neither persisted for resuming nor written to the response cache.
+    """
+
+    live = False
+
+    def __init__(self, backend, max_workers=MAX_INFLIGHT_REQUESTS):
+        self.backend = backend
+        self.max_workers = max_workers
+        self._batches = {}
+
+    def _answer(self, request):
+        try:
+            return request["custom_id"], self.backend.complete(request["params"]).text
+        except ReplayMissError as e:
+            print(f"❌ {e}")
+            return request["custom_id"], None
+
+    def submit(self, requests):
+        batch_id = f"replay-{uuid.uuid4().hex[:12]}"
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            self._batches[batch_id] = list(pool.map(self._answer, requests))
+        return batch_id
+
+    def is_finished(self, batch_id):
+        return True
+
+    def results(self, batch_id):
+        yield from self._batches.get(batch_id, [])
+
+
+def load_batch_state(state_path=BATCH_STATE_PATH):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_batch_state(state, state_path=BATCH_STATE_PATH):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    write_json_atomic(state_path, state, indent=2)
+
+
+def prepare_batch(cases, cache_mode):
+    """Renders prompts for all cases and returns (state, requests, contents).
+
+    Cases already present in the response cache are answered from it and not submitted.
+    """
+    state = {"batch_id": None, "cases": {}, "requests": {}}
+    requests = []
+    contents = {}
+
+    for index, case_path in enumerate(cases):
+        set_case(os.path.basename(case_path))
+        system_prompt = build_case_prompt(case_path)
+        if system_prompt is None:
+            print(f"No source code found in {case_path}. Skipping case.")
+            continue
+
+        key = cache_key(MODEL_NAME, MAX_TOKENS, TEMPERATURE, system_prompt)
+        state["cases"][case_path] = key
+
+        if cache_mode in ("read-through", "offline"):
+            content = load_cached_response(key)
+            count("cache_hits" if content is not None else "cache_misses")
+            if content is not None:
+                contents[case_path] = content
+                continue
+
+        if cache_mode == "offline":
+            print(f"❌ Cache miss in offline mode: {case_path}")
+            continue
+
+        # custom_id only allows [a-zA-Z0-9_-], so cases are referenced by index
+        custom_id = f"case-{index:05d}"
+        state["requests"][custom_id] = case_path
+        requests.append({"custom_id": custom_id, "params": build_request_params(system_prompt)})
+
+    return state, requests, contents
+
+
+def wait_for_batch(transport, batch_id, initial_delay=BATCH_POLL_INITIAL_SECONDS, max_delay=BATCH_POLL_MAX_SECONDS,
+                   max_wait=BATCH_MAX_WAIT_SECONDS):
+    """Polls the batch with exponential backoff until it has ended."""
+    started = time.monotonic()
+    delay = initial_delay
+
+    while not transport.is_finished(batch_id):
+        if time.monotonic() - started > max_wait:
+            raise TimeoutError(f"Batch {batch_id} did not finish in {max_wait} seconds")
+        print(f"⏳ Batch {batch_id} in progress, next check in {delay:.0f}s")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def run_batch(dataset_root=DATASET_ROOT_PATH, transport=None, state_path=BATCH_STATE_PATH, cache_mode=None, cases=None):
+    """Generates build files for every case (or only the given case folders of dataset_root) through one message batch
+    and scores them with score_corpus.
+
+    The batch id is persisted in state_path, so an interrupted run resumes polling the same batch instead of resubmitting.
+    Without a transport, the live backend submits to the Message Batches API and the replay backend answers offline
+    through ReplayBatchTransport.
+    """
+    cache_mode = cache_mode or RESPONSE_CACHE_MODE
+    if transport is None:
+        backend = get_backend()
+        if isinstance(backend, AnthropicBackend):
+            transport = AnthropicBatchTransport(backend.client)
+        elif isinstance(backend, ReplayBackend):
+            transport = ReplayBatchTransport(backend)
+        else:
+            print("❌ Message Batches need the live or replay model backend; use --all-cases for record runs")
+            return []
+    # Offline batches are answered at submission and not resumable; their responses are not model output to cache
+    live = getattr(transport, "live", True)
+
+    evict_cache()
+
+    state = load_batch_state(state_path) if live else None
+    contents = {}
+
+    if state is not None:
+        print(f"🔁 Resuming batch {state['batch_id']} from {state_path}")
+        # Cases that were cache hits at submission time are looked up again below
+    else:
+        cases = find_dataset_cases(dataset_root) if cases is None else cases
+        state, requests, contents = prepare_batch(cases, cache_mode)
+
+        if requests:
+            state["batch_id"] = transport.submit(requests)
+            if live:
+                save_batch_state(state, state_path)
+            print(f"📦 Submitted batch {state['batch_id']} with {len(requests)} request(s)")
+
+    if state["batch_id"] is not None:
+        wait_for_batch(transport, state["batch_id"])
+
+        for custom_id, text in transport.results(state["batch_id"]):
+            case_path = state["requests"].get(custom_id)
+            if case_path is None or text is None:
+                print(f"❌ Batch request {custom_id} failed")
+                continue
+            contents[case_path] = text
+            if cache_mode != "off" and live:
+                try:
+                    store_cached_response(state["cases"][case_path], text, MODEL_NAME)
+                except OSError as e:
+                    print(f"⚠️ Could not cache the response of {os.path.basename(case_path)}: {e}")
+
+    results = []
+    for case_path, key in state["cases"].items():
+        content = contents.get(case_path)
+        if content is None and cache_mode != "off":
+            content = load_cached_response(key)
+
+        # Like generate_build_files, start from an empty generated/ folder, so no file of an earlier run is scored
+        generated_path = os.path.join(case_path, "generated")
+        ensure_directory_exists(generated_path)
+        if content is None:
+            results.append(score_generated_case(case_path, None, None, None))
+        else:
+            save_optional_sections(generated_path, content)
+            results.append(score_generated_case(case_path, *parse_model_response(content)))
+
+    if live and os.path.exists(state_path):
+        os.remove(state_path)
+
+    results.sort(key=lambda r: r["case"])
+    score_corpus(results, dataset_root)
+    print_corpus_report(results)
+    record_run("batch", results)
+    finish_run()
+    return results
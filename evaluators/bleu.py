@@ -0,0 +1,103 @@
+"""
+BLEU for Gradle build files: clipped n-gram precisions up to BLEU_MAX_ORDER, brevity penalty and smoothing.
+
+Reference n-gram counts are built once per golden file and cached, so scoring many candidates
+(samples, models, temperatures) against the same reference only counts candidate n-grams.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from config.constants import BLEU_MAX_ORDER, BLEU_SMOOTHING
+from util.lazy_imports import optional_module
+
+# Comments are dropped; string literals, dotted names (libs.androidx.activity.compose), numbers/versions
+# and multi-char operators are kept as single tokens
+COMMENT_PATTERN = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+GRADLE_TOKEN_PATTERN = re.compile(
+    r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*|\d+(?:\.\d+)*|->|\+=|==|!=|&&|\|\||\S'
+)
+
+
+def gradle_tokenize(text):
+    return GRADLE_TOKEN_PATTERN.findall(COMMENT_PATTERN.sub(' ', text))
+
+
+def count_ngrams(tokens, max_order=BLEU_MAX_ORDER):
+    """Returns a list of Counters, one per n-gram order 1..max_order."""
+    return [Counter(zip(*(tokens[i:] for i in range(n)))) for n in range(1, max_order + 1)]
+
+
+@lru_cache(maxsize=1024)
+def reference_index(reference, max_order=BLEU_MAX_ORDER):
+    """Precomputed (token count, n-gram Counters) of a golden file; cached per reference content."""
+    tokens = gradle_tokenize(reference)
+    return len(tokens), count_ngrams(tokens, max_order)
+
+
+def clipped_counts(index, candidate, max_order=BLEU_MAX_ORDER):
+    """Returns (candidate length, matches per order, totals per order) with counts clipped by the reference."""
+    tokens = gradle_tokenize(candidate)
+    reference_counts = index[1]
+    matches, totals = [], []
+    for order, counts in enumerate(count_ngrams(tokens, max_order)):
+        reference_order = reference_counts[order]
+        matches.append(sum(min(count, reference_order[ngram]) for ngram, count in counts.items() if ngram in reference_order))
+        totals.append(max(0, len(tokens) - order))
+    return len(tokens), matches, totals
+
+
+def _smoothed_precisions(matches, totals, smoothing):
+    precisions = []
+    for order, (match, total) in enumerate(zip(matches, totals)):
+        if smoothing == "add-one" and order > 0:
+            # Lin & Och (2004): add one to numerator and denominator for n > 1
+            precisions.append((match + 1) / (total + 1))
+        elif match == 0 and smoothing == "epsilon":
+            precisions.append(0.1 / total if total else 0.0)
+        else:
+            precisions.append(match / total if total else 0.0)
+    return precisions
+
+
+def bleu_from_counts(candidate_length, reference_length, matches, totals, smoothing=BLEU_SMOOTHING):
+    if candidate_length == 0:
+        return 0.0
+
+    precisions = _smoothed_precisions(matches, totals, smoothing)
+    if min(precisions) <= 0:
+        return 0.0
+
+    log_precision = sum(math.log(p) for p in precisions) / len(precisions)
+    brevity_penalty = 1.0 if candidate_length > reference_length else math.exp(1 - reference_length / candidate_length)
+    return brevity_penalty * math.exp(log_precision)
+
+
+def sentence_bleu(reference, candidate, max_order=BLEU_MAX_ORDER, smoothing=BLEU_SMOOTHING):
+    index = reference_index(reference, max_order)
+    candidate_length, matches, totals = clipped_counts(index, candidate, max_order)
+    return bleu_from_counts(candidate_length, index[0], matches, totals, smoothing)
+
+
+def score_candidates(reference, candidates, max_order=BLEU_MAX_ORDER, smoothing=BLEU_SMOOTHING):
+    """Scores many candidates against one reference; the reference index is built once.
+
+    With NumPy the precision/brevity-penalty combination is computed for all candidates at once.
+    """
+    index = reference_index(reference, max_order)
+    counts = [clipped_counts(index, candidate, max_order) for candidate in candidates]
+
+    numpy = optional_module("numpy")
+    if numpy is None or not counts:
+        return [bleu_from_counts(length, index[0], matches, totals, smoothing) for length, matches, totals in counts]
+
+    lengths = numpy.array([length for length, _, _ in counts], dtype=float)
+    precisions = numpy.array([_smoothed_precisions(matches, totals, smoothing) for _, matches, totals in counts])
+    valid = (lengths > 0) & (precisions.min(axis=1) > 0)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        log_precision = numpy.log(numpy.where(precisions > 0, precisions, 1.0)).mean(axis=1)
+        brevity_penalty = numpy.where(lengths > index[0], 1.0, numpy.exp(1 - index[0] / numpy.maximum(lengths, 1)))
+
+    return numpy.where(valid, brevity_penalty * numpy.exp(log_precision), 0.0).tolist()
@@ -0,0 +1,186 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config.constants import DATASET_ROOT_PATH, MAX_PARALLEL_CASES, MAX_INFLIGHT_REQUESTS
+from evaluators.artifact_scoring import average_metrics, print_results_table, score_matrix
+from evaluators.model_evaluator import generate_build_files
+from evaluators.project_assembler import assemble_projects
+from evaluators.static_validator import find_version_catalog, first_validation_error, validate_project
+from util.api_client import AdaptiveConcurrencyLimiter
+from util.folder_helper import find_dataset_cases, save_generated_files
+from util.response_cache import evict_cache
+from util.instrumentation import finish_run, set_case
+from util.results_store import record_run
+
+
+def evaluate_case(case_path, request_slots, cache_mode=None, stream=None):
+    """Generates and scores build files for a single case, writing into the case's own generated/ folder."""
+    generated_path = os.path.join(case_path, "generated")
+    set_case(os.path.basename(case_path))
+
+    stats = {}
+    root_build, app_build, settings = generate_build_files(case_path, generated_path, request_slots, cache_mode=cache_mode, stream=stream,
+                                                           stats=stats)
+
+    result = score_generated_case(case_path, root_build, app_build, settings)
+    result["generation"] = stats
+    return result
+
+
+def score_generated_case(case_path, root_build, app_build, settings):
+    """Saves generated build files of a case and validates them; artifact scores are added by score_corpus."""
+    case_name = os.path.basename(case_path)
+    generated_path = os.path.join(case_path, "generated")
+
+    if root_build is None or app_build is None or settings is None:
+        return {"case": case_name, "status": "generation_failed", "metrics": {}}
+
+    save_generated_files(generated_path, root_build, app_build, settings)
+    return validated_case_result(case_path)
+
+
+def validated_case_result(case_path):
+    """Result row for a case whose generated/ output is on disk, with its tier-0 validation."""
+    validation = validate_case_output(case_path)
+    metrics = {"validation": {"static_valid": 1.0 if validation["passed"] else 0.0}}
+    return {"case": os.path.basename(case_path), "status": "ok", "metrics": metrics, "validation": validation}
+
+
+def validate_case_output(case_path, generated_path=None):
+    """Tier-0 static validation of a case's generated output (generated/ unless another folder is given)."""
+    generated_path = generated_path or os.path.join(case_path, "generated")
+    catalog_path = find_version_catalog(generated_path, os.path.join(case_path, "golden_output"), os.path.join(case_path, "input_codebase"))
+    return validate_project(generated_path, catalog_path)
+
+
+def run_corpus(dataset_root=DATASET_ROOT_PATH, max_workers=None, max_inflight_requests=None, cache_mode=None, stream=None, assemble=False):
+    """Evaluates every case of the dataset concurrently and prints one aggregated report.
+
+    With assemble=True the generated projects are also built with Gradle and compile success is added to the metrics.
+    """
+    max_workers = max_workers or MAX_PARALLEL_CASES
+    max_inflight_requests = max_inflight_requests or MAX_INFLIGHT_REQUESTS
+
+    evict_cache()
+
+    cases = find_dataset_cases(dataset_root)
+    if not cases:
+        print(f"❌ No cases found in {dataset_root}")
+        return []
+
+    print(f"🚀 Evaluating {len(cases)} case(s) with {max_workers} worker(s), {max_inflight_requests} in-flight request(s)")
+
+    # Model calls are network-bound, so threads are enough; the limiter caps concurrent API requests
+    # and lowers the cap when the API starts rate limiting
+    request_slots = AdaptiveConcurrencyLimiter(max_inflight_requests)
+    results = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(evaluate_case, case_path, request_slots, cache_mode, stream): case_path for case_path in cases}
+        for future in as_completed(futures):
+            case_name = os.path.basename(futures[future])
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"❌ Case {case_name} failed: {e}")
+                results.append({"case": case_name, "status": "error", "metrics": {}})
+
+    results.sort(key=lambda r: r["case"])
+    score_corpus(results, dataset_root)
+
+    if assemble:
+        add_assembly_results(results, dataset_root)
+
+    print_corpus_report(results)
+    record_run("corpus", results)
+    finish_run()
+    return results
+
+
+def rescore_corpus(dataset_root=DATASET_ROOT_PATH, assemble=False):
+    """Validates and scores the generated/ outputs already on disk for every case, without calling the model."""
+    results = []
+    for case_path in find_dataset_cases(dataset_root):
+        set_case(os.path.basename(case_path))
+        if os.path.isdir(os.path.join(case_path, "generated")):
+            results.append(validated_case_result(case_path))
+        else:
+            results.append({"case": os.path.basename(case_path), "status": "not_generated", "metrics": {}})
+
+    if not results:
+        print(f"❌ No cases found in {dataset_root}")
+        return []
+
+    score_corpus(results, dataset_root)
+
+    if assemble:
+        add_assembly_results(results, dataset_root)
+
+    print_corpus_report(results)
+    record_run("score", results)
+    finish_run()
+    return results
+
+
+def score_corpus(results, dataset_root):
+    """Scores all artifacts of every generated case in one process-pool fan-out and adds them to the case metrics."""
+    generated = [r for r in results if r["status"] == "ok"]
+    cases = [(os.path.join(dataset_root, r["case"]), os.path.join(dataset_root, r["case"], "generated")) for r in generated]
+
+    for result, scores in zip(generated, score_matrix(cases)):
+        result["metrics"] = {**scores, **result["metrics"]}
+
+
+def add_assembly_results(results, dataset_root):
+    """Builds every generated case that passes tier-0 validation and stores compile success and the first error.
+
+    Cases rejected by the static tier count as compile failures without spending a Gradle build on them.
+    """
+    generated = [r for r in results if r["status"] == "ok"]
+    to_build = []
+
+    for result in generated:
+        validation = result.get("validation") or validate_case_output(os.path.join(dataset_root, result["case"]))
+        if validation["passed"]:
+            to_build.append(result)
+        else:
+            result["assembly"] = {"case": result["case"], "success": False, "status": "static_failed",
+                                  "first_error": first_validation_error(validation), "duration": 0.0}
+            result["metrics"]["assembly"] = {"compile_success": 0.0}
+
+    print(f"🧱 {len(to_build)}/{len(generated)} case(s) passed static validation and go to Gradle")
+
+    assembly_results = assemble_projects([os.path.join(dataset_root, r["case"]) for r in to_build])
+    for result, assembly in zip(to_build, assembly_results):
+        result["assembly"] = assembly
+        if assembly["status"] in ("passed", "failed", "timeout"):
+            result["metrics"]["assembly"] = {"compile_success": 1.0 if assembly["success"] else 0.0}
+
+
+def print_corpus_report(results):
+    """Prints one results table: a row per scored artifact, a case score row and averages across cases."""
+    print("\n" + "=" * 60)
+    print("📋 CORPUS REPORT")
+    print("=" * 60)
+
+    rows = []
+    for result in results:
+        if result["status"] != "ok":
+            continue
+        metrics = {name: values for name, values in result["metrics"].items() if name not in ("validation", "assembly")}
+        # Validation and build outcomes are shown on the case score row
+        metrics["overall"] = {**metrics.get("overall", {}), **result["metrics"].get("validation", {}), **result["metrics"].get("assembly", {})}
+        rows.append((result["case"], metrics))
+
+    if rows:
+        print_results_table(rows + [("average", average_metrics([metrics for _, metrics in rows]))])
+
+    for result in results:
+        if result["status"] != "ok":
+            print(f"❌ {result['case']}: {result['status']}")
+        assembly = result.get("assembly")
+        if assembly is not None and assembly["first_error"]:
+            print(f"   {result['case']} assembly {assembly['status']}: {assembly['first_error']}")
+
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    print(f"\n✅ Succeeded: {succeeded}/{len(results)}")
@@ -0,0 +1,211 @@
+"""
+Single-pass structured parser for build.gradle.kts dependency declarations.
+
+The file is tokenized once with one compiled pattern; a block stack tracks nesting such as
+kotlin { sourceSets { commonMain.dependencies { ... } } }, so every dependency and plugin is
+attributed to its source set. Parse results are memoized per file content.
+"""
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+Dependency = namedtuple("Dependency", ["configuration", "notation", "source_set", "kind"])
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"""(?:.|\n)*?"""|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)
+  | (?P<symbol>[{}()\[\]]|[^\s\w])
+''', re.VERBOSE | re.DOTALL)
+
+# implementation, api, ... and source-set prefixed variants such as commonMainImplementation or testImplementation
+CONFIGURATION_PATTERN = re.compile(
+    r'^(?:(?P<prefix>\w+?)(?:Implementation|Api|CompileOnly|RuntimeOnly)'
+    r'|implementation|api|compileOnly|runtimeOnly|kapt|ksp|annotationProcessor|coreLibraryDesugaring)$'
+)
+SOURCE_SET_PATTERN = re.compile(r'^\w+(?:Main|Test)$')
+PLUGIN_FUNCTIONS = {"alias", "id"}
+DELEGATE_FUNCTIONS = {"getting", "creating", "registering"}
+
+
+def tokenize(content):
+    """Yields (kind, value) tokens, skipping comments."""
+    for match in TOKEN_PATTERN.finditer(content):
+        kind = match.lastgroup
+        if kind != "comment":
+            yield kind, match.group(kind)
+
+
+def _source_set(stack, configuration):
+    for block in reversed(stack):
+        if block.endswith(".dependencies"):
+            return block[:-len(".dependencies")]
+        if SOURCE_SET_PATTERN.match(block):
+            return block
+
+    prefix = CONFIGURATION_PATTERN.match(configuration).group("prefix")
+    if prefix:
+        # androidTestImplementation -> androidTest, debugImplementation -> debug
+        return prefix
+    return "main"
+
+
+def _read_argument(tokens, start):
+    """Reads the call arguments starting after '(' and returns (notation, kind, index after the closing ')')."""
+    depth = 1
+    i = start
+    notation, kind = None, None
+    wrapper = None
+
+    while i < len(tokens) and depth:
+        token_kind, value = tokens[i]
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif notation is None:
+            if token_kind == "string":
+                notation = value.strip("\"'")
+                kind = wrapper or "coordinate"
+            elif token_kind == "name":
+                if value.startswith("libs.plugins."):
+                    notation, kind = value[len("libs.plugins."):], "catalog_plugin"
+                elif value.startswith("libs."):
+                    notation, kind = value[len("libs."):], "catalog"
+                elif value.startswith("compose."):
+                    notation, kind = value, "compose"
+                elif i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+                    # kotlin("test"), project(":shared"), platform(libs.bom): notation is the inner argument
+                    wrapper = value if value in ("kotlin", "project") else wrapper
+                elif value not in ("libs", "compose"):
+                    notation, kind = value, "reference"
+        i += 1
+
+    return notation, kind, i
+
+
+@lru_cache(maxsize=1024)
+def parse_gradle_build(content):
+    """Parses dependency and plugin declarations of a build.gradle.kts in a single pass.
+
+    Returns a tuple of Dependency(configuration, notation, source_set, kind); plugins are reported with
+    configuration "plugin" and source set "plugins".
+    """
+    tokens = list(tokenize(content))
+    dependencies = []
+
+    # Block stack of names; paren depth is saved per block so lambdas inside calls nest correctly
+    stack = []
+    saved_depths = []
+    paren_depth = 0
+    pending_name = None
+    i = 0
+
+    while i < len(tokens):
+        kind, value = tokens[i]
+
+        if kind == "name":
+            next_value = tokens[i + 1][1] if i + 1 < len(tokens) else None
+            in_plugins = bool(stack) and stack[-1] == "plugins"
+
+            if next_value == "(" and (CONFIGURATION_PATTERN.match(value) or (in_plugins and (value in PLUGIN_FUNCTIONS or value == "kotlin"))):
+                notation, notation_kind, i = _read_argument(tokens, i + 2)
+                if notation is not None:
+                    if in_plugins:
+                        if value == "kotlin":
+                            notation_kind = "kotlin_plugin"
+                        elif notation_kind == "coordinate":
+                            notation_kind = "plugin_id"
+                        dependencies.append(Dependency("plugin", notation, "plugins", notation_kind))
+                    else:
+                        dependencies.append(Dependency(value, notation, _source_set(stack, value), notation_kind))
+                continue
+
+            if paren_depth == 0:
+                if value in DELEGATE_FUNCTIONS and i >= 2 and tokens[i - 1][1] == "by":
+                    # val commonMain by getting { ... }
+                    pending_name = tokens[i - 2][1]
+                else:
+                    pending_name = value
+
+        elif value == "(":
+            paren_depth += 1
+        elif value == ")":
+            paren_depth = max(0, paren_depth - 1)
+        elif value == "{":
+            stack.append(pending_name or "")
+            saved_depths.append(paren_depth)
+            paren_depth = 0
+            pending_name = None
+        elif value == "}":
+            if stack:
+                stack.pop()
+                paren_depth = saved_depths.pop()
+            pending_name = None
+
+        i += 1
+
+    return tuple(dependencies)
+
+
+def _catalog_accessor(alias):
+    # Catalog aliases are exposed with '-', '_' and '.' all turned into '.'
+    return re.sub(r'[-_.]', '.', alias)
+
+
+def load_version_catalog(path):
+    """Loads gradle/libs.versions.toml into {"libraries": {accessor: coordinate}, "plugins": {accessor: id},
+    "versions": {accessor: version}, "bundles": {accessor: [aliases]}}, or None."""
+    if tomllib is None or not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+
+    libraries = {}
+    for alias, spec in data.get("libraries", {}).items():
+        if isinstance(spec, str):
+            coordinate = spec.rsplit(":", 1)[0] if spec.count(":") == 2 else spec
+        elif "module" in spec:
+            coordinate = spec["module"]
+        else:
+            coordinate = f"{spec.get('group')}:{spec.get('name')}"
+        libraries[_catalog_accessor(alias)] = coordinate
+
+    plugins = {}
+    for alias, spec in data.get("plugins", {}).items():
+        plugins[_catalog_accessor(alias)] = spec.split(":")[0] if isinstance(spec, str) else spec.get("id")
+
+    versions = {_catalog_accessor(alias): spec for alias, spec in data.get("versions", {}).items()}
+    bundles = {_catalog_accessor(alias): spec for alias, spec in data.get("bundles", {}).items()}
+
+    return {"libraries": libraries, "plugins": plugins, "versions": versions, "bundles": bundles}
+
+
+def resolve_catalog(dependencies, catalog):
+    """Replaces version catalog aliases with the coordinates or plugin ids they point to."""
+    if not catalog:
+        return dependencies
+
+    resolved = []
+    for dependency in dependencies:
+        if dependency.kind == "catalog" and dependency.notation in catalog["libraries"]:
+            dependency = dependency._replace(notation=catalog["libraries"][dependency.notation], kind="coordinate")
+        elif dependency.kind == "catalog_plugin" and dependency.notation in catalog["plugins"]:
+            dependency = dependency._replace(notation=catalog["plugins"][dependency.notation], kind="plugin_id")
+        resolved.append(dependency)
+    return tuple(resolved)
+
+
+def dependencies_by_source_set(dependencies):
+    """Groups dependency notations into {source_set: set}."""
+    grouped = {}
+    for dependency in dependencies:
+        grouped.setdefault(dependency.source_set, set()).add(dependency.notation)
+    return grouped
@@ -1,258 +1,236 @@
 import os
-import difflib
-import anthropic
-import re
-from difflib import SequenceMatcher
-from config.constants import ANTHROPIC_API_KEY, MODEL_NAME, MAX_TOKENS, TEMPERATURE, GOLDEN_DATASET_PATH, GENERATED_OUTPUT_PATH
-from prompts.system_prompt_generator import generate_system_prompt
-from util.folder_helper import ensure_directory_exists, find_relevant_files_in_codebase
-
-def generate_build_files():
-
-    ensure_directory_exists(GENERATED_OUTPUT_PATH)
-
-    source_code = find_relevant_files_in_codebase(os.path.join(GOLDEN_DATASET_PATH, "input_codebase"))
-
-    if source_code is None:
-        print("No source code found. Exiting.")
-        exit(1)
+import time
+from config.constants import MODEL_NAME, MAX_TOKENS, TEMPERATURE, GOLDEN_DATASET_PATH, GENERATED_OUTPUT_PATH, RESPONSE_CACHE_MODE, STREAM_RESPONSES, PROMPT_CACHING
+from prompts.system_prompt_generator import render_prompt, split_prompt
+from prompts.context_packer import pack_codebase_context
+from evaluators.artifact_scoring import print_results_table, score_case
+from evaluators.response_parser import MarkerStreamParser, SECTION_FILES, parse_sections
+from util.folder_helper import ensure_directory_exists, save_generated_section
+from util.api_client import call_with_retries
+from util.instrumentation import count, record_span, span
+from util.model_backends import get_backend
+from util.response_cache import cache_key, load_cached_response, store_cached_response
+
+def generate_build_files(golden_path=GOLDEN_DATASET_PATH, generated_path=GENERATED_OUTPUT_PATH, request_slots=None, backend=None, cache_mode=None,
+                         stream=None, on_section=None, stats=None):
+    """Generates build files for one dataset case. request_slots is an optional AdaptiveConcurrencyLimiter shared between cases.
+
+    In streaming mode every section is written to generated_path (or passed to on_section) as soon as it is complete.
+    stats, if given, is filled with prompt hash, cache hit, token counts and generation time.
+    """
+
+    ensure_directory_exists(generated_path)
+
+    system_prompt = build_case_prompt(golden_path)
+
+    if system_prompt is None:
+        print("No source code found. Skipping case.")
+        return None, None, None
 
     else:
-        system_prompt = generate_system_prompt(source_code)
+        return generate_from_prompt(system_prompt, generated_path, request_slots, backend, cache_mode, stream, on_section, stats=stats)
+
+
+def generate_from_prompt(system_prompt, generated_path, request_slots=None, backend=None, cache_mode=None, stream=None, on_section=None, sample=0,
+                         stats=None):
+    """Gets the model response for an already rendered prompt (from the cache or the model backend) and extracts the build files.
+
+    backend defaults to the process-wide one (live, record or replay, see util.model_backends).
+    sample distinguishes independent draws of the same prompt in the response cache.
+    """
+    cache_mode = cache_mode or RESPONSE_CACHE_MODE
+    key = cache_key(MODEL_NAME, MAX_TOKENS, TEMPERATURE, system_prompt, sample)
+    stats = {} if stats is None else stats
+    stats["prompt_hash"] = key[:16]
+    started = time.perf_counter()
+
+    content = None
+    if cache_mode in ("read-through", "offline"):
+        with span("cache"):
+            content = load_cached_response(key)
+        count("cache_hits" if content is not None else "cache_misses")
+        if content is not None:
+            print(f"💾 Cache hit: {key[:12]}")
+    stats["cache_hit"] = content is not None
+
+    if content is None:
+        if cache_mode == "offline":
+            print(f"❌ Cache miss in offline mode: {key[:12]}")
+            return None, None, None
+
+        if backend is None:
+            backend = get_backend()
 
-        print("api key:", ANTHROPIC_API_KEY)
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+        if stream is None:
+            stream = STREAM_RESPONSES
 
         try:
-            response = client.messages.create(
-                model=MODEL_NAME,
-                max_tokens=MAX_TOKENS,
-                temperature=TEMPERATURE,
-                messages=[
-                    {"role": "user", "content": system_prompt}
-                ]
-            )
-            content = ""
-            for block in response.content:
-                if block.type == "text":
-                    content += block.text
-            
-            # What has been received from the model
-            print(f"📝 Model response length: {len(content)} characters")
-            print(f"📝 Response preview: {content[:200]}...")
-            
-            # Marker checks
-            markers = ["[ROOT_BUILD_START]", "[ROOT_BUILD_END]", "[APP_BUILD_START]", "[APP_BUILD_END]", "[SETTINGS_START]", "[SETTINGS_END]"]
-            for marker in markers:
-                if marker in content:
-                    print(f"✅ Found marker: {marker}")
+            with span("api", stream=bool(stream)):
+                if stream:
+                    if on_section is None:
+                        on_section = lambda name, section: save_generated_section(generated_path, SECTION_FILES[name], section)
+                    content = stream_model_response(backend, system_prompt, request_slots, on_section, stats)
                 else:
-                    print(f"❌ Missing marker: {marker}")
-            
-            # Files extraction
-            try:
-                root_build_content = content.split("[ROOT_BUILD_START]")[1].split("[ROOT_BUILD_END]")[0].strip()
-                print(f"✅ Root build extracted: {len(root_build_content)} chars")
-            except IndexError:
-                print("❌ Failed to extract root build content")
-                root_build_content = None
-                
-            try:
-                app_build_content = content.split("[APP_BUILD_START]")[1].split("[APP_BUILD_END]")[0].strip()
-                print(f"✅ App build extracted: {len(app_build_content)} chars")
-            except IndexError:
-                print("❌ Failed to extract app build content")
-                app_build_content = None
-                
-            try:
-                settings_content = content.split("[SETTINGS_START]")[1].split("[SETTINGS_END]")[0].strip()
-                print(f"✅ Settings extracted: {len(settings_content)} chars")
-            except IndexError:
-                print("❌ Failed to extract settings content")
-                settings_content = None
-
-            # Preview extracted contents
-            print(f"\n🔍 Root build preview: '{root_build_content[:100] if root_build_content else 'EMPTY'}'")
-            print(f"🔍 App build preview: '{app_build_content[:100] if app_build_content else 'EMPTY'}'")  
-            print(f"🔍 Settings preview: '{settings_content[:100] if settings_content else 'EMPTY'}'")
-
-            return root_build_content, app_build_content, settings_content
-
+                    content = request_model_response(backend, system_prompt, request_slots, stats)
         except Exception as e:
             print(f"API parsing error: {e}")
             return None, None, None
 
-
-
-"""
-BLUE-like metric implementation for n-grams
-"""
-def calculate_bleu_score(reference, candidate):
-    ref_words = reference.split()
-    cand_words = candidate.split()
-    
-    if not cand_words:
-        return 0.0
-    
-    # 1-grams
-    ref_1grams = set(ref_words)
-    cand_1grams = set(cand_words)
-    precision_1 = len(ref_1grams & cand_1grams) / len(cand_1grams) if cand_1grams else 0
-
-    # 2-grams
-    ref_2grams = set(zip(ref_words, ref_words[1:]))
-    cand_2grams = set(zip(cand_words, cand_words[1:]))
-    precision_2 = len(ref_2grams & cand_2grams) / len(cand_2grams) if cand_2grams else 0
-
-    # Combined BLUE-like metric
-    return (precision_1 + precision_2) / 2
-
-
-
-"""
-Text similarity ratio
-"""
-def calculate_similarity_ratio(text1, text2):
-    return SequenceMatcher(None, text1, text2).ratio()
-
-def extract_dependencies(gradle_content):
-    """Extracts dependencies from build.gradle.kts"""
-    dependencies = []
-
-    # Various patterns for Kotlin DSL
-    patterns = [
-        # Regular dependencies: implementation("lib:name:version")
-        r'(?:implementation|api|compileOnly|runtimeOnly|testImplementation)\s*\(\s*["\']([^"\']+)["\']',
-        # Version catalogs: implementation(libs.androidx.activity.compose)
-        r'(?:implementation|api|compileOnly|runtimeOnly|testImplementation)\s*\(\s*libs\.([^)]+)\)',
-        # Compose dependencies: implementation(compose.runtime)
-        r'(?:implementation|api|compileOnly|runtimeOnly|testImplementation)\s*\(\s*(compose\.[^)]+)\)',
-        # Kotlin dependencies: implementation(kotlin("test"))
-        r'(?:implementation|api|compileOnly|runtimeOnly|testImplementation)\s*\(\s*kotlin\s*\(\s*["\']([^"\']+)["\']',
-        # Plugin aliases: alias(libs.plugins.kotlin.multiplatform)
-        r'alias\s*\(\s*libs\.plugins\.([^)]+)\)',
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, gradle_content, re.IGNORECASE | re.MULTILINE)
-        dependencies.extend(matches)
-
-    # Also search for dependencies and sourceSets blocks for context
-    deps_blocks = re.findall(r'dependencies\s*\{([^}]+)\}', gradle_content, re.DOTALL)
-    for block in deps_blocks:
-        # Simple dependencies within blocks
-        simple_deps = re.findall(r'(?:implementation|api|compileOnly|runtimeOnly|testImplementation)\s*\(\s*["\']([^"\']+)["\']', block)
-        dependencies.extend(simple_deps)
+        # Replayed and stub responses are not model output and must not be served to later live runs
+        if cache_mode != "off" and getattr(backend, "live", True):
+            # The response is already paid for; a cache that cannot be written must not fail the case
+            try:
+                store_cached_response(key, content, MODEL_NAME)
+            except OSError as e:
+                print(f"⚠️ Could not cache response {key[:12]}: {e}")
+
+    stats["duration"] = time.perf_counter() - started
+    with span("parse"):
+        save_optional_sections(generated_path, content)
+        return parse_model_response(content)
+
+
+def build_case_prompt(golden_path):
+    """Renders the generation prompt for a dataset case, or returns None if the case has no sources."""
+    with span("scan"):
+        pieces, _ = pack_codebase_context(os.path.join(golden_path, "input_codebase"))
+    if pieces is None:
+        return None
+    with span("render"):
+        return render_prompt(pieces)
+
+
+def build_request_params(system_prompt, prompt_caching=PROMPT_CACHING):
+    """Messages API parameters shared by regular, streaming and batch requests.
+
+    With prompt caching the stable prefix (instructions and codebase) is a separate content block with a cache breakpoint,
+    followed by the short variable suffix, so repeated requests for a case only pay full price for the suffix.
+    """
+    prefix, suffix = split_prompt(system_prompt)
+    if prompt_caching and suffix:
+        content = [
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": suffix},
+        ]
+    else:
+        content = system_prompt
+
+    return {
+        "model": MODEL_NAME,
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+        "messages": [
+            {"role": "user", "content": content}
+        ],
+    }
+
+
+def record_usage(stats, response):
+    """Copies token counts of a ModelResponse, including prompt cache reads and writes, into stats."""
+    if stats is not None and response.input_tokens is not None:
+        stats["input_tokens"] = response.input_tokens
+        stats["output_tokens"] = response.output_tokens
+        stats["cache_read_tokens"] = response.cache_read_tokens
+        stats["cache_write_tokens"] = response.cache_write_tokens
+        count("input_tokens", response.input_tokens)
+        count("output_tokens", response.output_tokens)
+        count("cache_read_tokens", response.cache_read_tokens)
+        count("cache_write_tokens", response.cache_write_tokens)
+
+
+def request_model_response(backend, system_prompt, request_slots=None, stats=None):
+    """Sends the prompt to the model backend and returns the text of the response."""
+
+    def call():
+        response = backend.complete(build_request_params(system_prompt))
+        record_usage(stats, response)
+        return response.text
+
+    return call_with_retries(call, request_slots)
+
+
+def stream_model_response(backend, system_prompt, request_slots=None, on_section=None, stats=None):
+    """Streams the model response, handing every section to on_section as soon as its END marker arrives.
+
+    The stream is closed once all required sections have been received.
+    """
+
+    def call():
+        parser = MarkerStreamParser()
+        started = time.perf_counter()
+        first_token = []
+
+        def on_text(text):
+            if not first_token:
+                first_token.append(time.perf_counter() - started)
+                record_span("first_token", first_token[0])
+            for name, section in parser.feed(text):
+                print(f"⚡ Section {name} received: {len(section)} chars")
+                if on_section is not None:
+                    on_section(name, section)
+            if parser.is_complete():
+                print("⚡ All sections received, closing stream")
+                return True
+            return False
+
+        response = backend.stream(build_request_params(system_prompt), on_text)
+        record_usage(stats, response)
+        if stats is not None and first_token:
+            stats["first_token_seconds"] = first_token[0]
+        return response.text
+
+    return call_with_retries(call, request_slots)
+
+
+def save_optional_sections(generated_path, content):
+    """Writes sections that are scored but not returned by parse_model_response (gradlew.bat)."""
+    gradlew = parse_sections(content).get("GRADLEW")
+    if gradlew is not None:
+        save_generated_section(generated_path, SECTION_FILES["GRADLEW"], gradlew)
+
+
+def parse_model_response(content):
+    """Extracts root build, app build and settings contents from the marked model response."""
+
+    # What has been received from the model
+    print(f"📝 Model response length: {len(content)} characters")
+    print(f"📝 Response preview: {content[:200]}...")
     
-    return set(dependencies)
+    sections = parse_sections(content)
 
+    # Marker checks
+    for name in SECTION_FILES:
+        if name in sections:
+            print(f"✅ Found section: {name}")
+        else:
+            print(f"❌ Missing section: {name}")
 
-"""
-Calculates precision, recall, F1 for dependencies
-"""
-def calculate_dependency_metrics(golden_deps, generated_deps):
-    
-    if not golden_deps and not generated_deps:
-        return 1.0, 1.0, 1.0
-    if not generated_deps:
-        return 0.0, 0.0, 0.0
-    if not golden_deps:
-        return 0.0, 1.0, 0.0
-        
-    intersection = golden_deps & generated_deps
-    precision = len(intersection) / len(generated_deps)
-    recall = len(intersection) / len(golden_deps)
-    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0.0
-    
-    return precision, recall, f1
+    # Files extraction
+    root_build_content = sections.get("ROOT_BUILD")
+    app_build_content = sections.get("APP_BUILD")
+    settings_content = sections.get("SETTINGS")
 
+    for label, extracted in (("Root build", root_build_content), ("App build", app_build_content), ("Settings", settings_content)):
+        if extracted is None:
+            print(f"❌ Failed to extract {label.lower()} content")
+        else:
+            print(f"✅ {label} extracted: {len(extracted)} chars")
 
-"""
-Compare generated files against golden files with detailed metrics
-"""
-def compare_results(golden_path, generated_path):
+    # Preview extracted contents
+    print(f"\n🔍 Root build preview: '{root_build_content[:100] if root_build_content else 'EMPTY'}'")
+    print(f"🔍 App build preview: '{app_build_content[:100] if app_build_content else 'EMPTY'}'")  
+    print(f"🔍 Settings preview: '{settings_content[:100] if settings_content else 'EMPTY'}'")
+
+    return root_build_content, app_build_content, settings_content
 
-    print("\n--- Compare results ---")
 
-    files_to_compare = [
-        "build.gradle.kts"
-    ]
-    
-    for file_path in files_to_compare:
-        golden_file = os.path.join(golden_path, "golden_output", file_path)
-        generated_file = os.path.join(generated_path, file_path)
-        
-        print(f"\n File to compare: {file_path}")
-        print(f"Golden file path: {golden_file}")
-        print(f"Generated file path: {generated_file}")
-        
-        if not os.path.exists(golden_file):
-            print(f"Golden file not found: {golden_file}")
-            continue
-            
-        if not os.path.exists(generated_file):
-            print(f"Generated file not found: {generated_file}")
-            continue
-            
-        with open(golden_file, 'r', encoding='utf-8') as f1, open(generated_file, 'r', encoding='utf-8') as f2:
-            golden_content = f1.read()
-            generated_content = f2.read()
-
-            print(f"\n=== DETAILED METRICS ===")
-            
-            # --- Metric 1: Similarity Ratio ---
-            similarity = calculate_similarity_ratio(golden_content, generated_content)
-            print(f"📊 Similarity Ratio: {similarity:.3f}")
-            
-            # --- Metric 2: BLEU-like Score ---
-            bleu = calculate_bleu_score(golden_content, generated_content)
-            print(f"📊 BLEU-like Score: {bleu:.3f}")
-            
-            # --- Metric 3: Line-by-line diff ---
-            golden_lines = golden_content.splitlines()
-            generated_lines = generated_content.splitlines()
-            diff = list(difflib.unified_diff(golden_lines, generated_lines, lineterm=''))
-            if not diff:
-                print("📊 Text match: 100%")
-            else:
-                match_percentage = max(0, 100 - len(diff) * 2)  
-                print(f"📊 Text match: ~{match_percentage}%")
-                if len(diff) <= 20:  
-                    print("--- Differences ---")
-                    print("\n".join(diff[:20]))
-                    if len(diff) > 20:
-                        print(f"... and {len(diff) - 20} more differences")
-
-            # --- Metric 4: Dependency Analysis (for build files) ---
-            if file_path.endswith("build.gradle.kts"):
-                golden_deps = extract_dependencies(golden_content)
-                generated_deps = extract_dependencies(generated_content)
-                
-                
-                print(f"🔍 Golden dependencies found ({len(golden_deps)}): {list(golden_deps)[:10]}")
-                print(f"🔍 Generated dependencies found ({len(generated_deps)}): {list(generated_deps)[:10]}")
-                
-                precision, recall, f1 = calculate_dependency_metrics(golden_deps, generated_deps)
-                print(f"📊 Dependencies - Precision: {precision:.3f}, Recall: {recall:.3f}, F1: {f1:.3f}")
-                
-                missing_deps = golden_deps - generated_deps
-                extra_deps = generated_deps - golden_deps
-                
-                if missing_deps:
-                    print(f"❌ Missing dependencies: {', '.join(list(missing_deps)[:5])}")
-                if extra_deps:
-                    print(f"➕ Extra dependencies: {', '.join(list(extra_deps)[:5])}")
-                if not missing_deps and not extra_deps:
-                    print("✅ All dependencies match!")
-
-            # --- Metric 5: Key dependency check (for app build) ---
-            if "composeApp" in file_path:
-                key_deps = ['io.ktor:ktor-client-core', 'compose.runtime', 'compose.foundation']
-                found_key_deps = [dep for dep in key_deps if dep in generated_content]
-                print(f"📊 Key dependencies found: {len(found_key_deps)}/{len(key_deps)}")
-                for dep in key_deps:
-                    status = "✅" if dep in generated_content else "❌"
-                    print(f"  {status} {dep}")
-            
-            print("=" * 50)
 
+def compare_results(golden_path, generated_path):
+    """Scores every generated artifact against the golden output and prints one compact results table.
+
+    Returns {artifact: metrics, "overall": {"score": ...}}, see evaluators.artifact_scoring.
+    """
+    metrics = score_case(golden_path, generated_path)
+    print()
+    print_results_table([(os.path.basename(os.path.normpath(golden_path)), metrics)])
+    return metrics
@@ -1,8 +1,14 @@
 import os
+import re
 import shutil
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from config.constants import GOLDEN_DATASET_PATH
+from config.constants import (GOLDEN_DATASET_PATH, ASSEMBLY_WORKSPACE_PATH, ASSEMBLY_GRADLE_USER_HOME, ASSEMBLY_TASK,
+                              ASSEMBLY_MAX_PARALLEL_BUILDS, ASSEMBLY_TIMEOUT_SECONDS)
+from evaluators.static_validator import find_version_catalog, validate_project
+from util.instrumentation import record_span
 
 def assemble_project_stub(golden_path):
     """Заглушка для тестирования сборки - использует готовые файлы из golden_output"""
@@ -36,132 +42,184 @@ def assemble_project_stub(golden_path):
         else:
             print(f"   [FILE] {item}")
     
-    # Имитируем проверку синтаксиса build.gradle.kts
-    build_gradle = os.path.join(golden_output_path, "build.gradle.kts")
-    if os.path.exists(build_gradle):
-        with open(build_gradle, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Простые проверки синтаксиса
-        syntax_checks = [
-            ("plugins block", "plugins" in content),
-            ("kotlin block", "kotlin" in content or "multiplatform" in content),
-            ("android block", "android" in content),
-            ("braces balanced", content.count("{") == content.count("}")),
-        ]
-        
-        print(f"\n🔍 Syntax checks for build.gradle.kts:")
-        all_passed = True
-        for check_name, passed in syntax_checks:
-            status = "✅" if passed else "❌"
-            print(f"   {status} {check_name}")
-            if not passed:
-                all_passed = False
-                
-        if all_passed:
-            print(f"\n🎉 Golden files pass basic validation!")
-            return True
-        else:
-            print(f"\n❌ Golden files have syntax issues!")
-            return False
+    # Tier-0 static validation of the build files
+    validation = validate_project(golden_output_path, find_version_catalog(golden_output_path, os.path.join(golden_path, "input_codebase")))
+
+    print(f"\n🔍 Static checks:")
+    for relative_path, errors in validation["files"].items():
+        status = "✅" if not errors else "❌"
+        print(f"   {status} {relative_path}")
+        for error in errors:
+            print(f"      {error}")
+
+    if validation["passed"]:
+        print(f"\n🎉 Golden files pass basic validation!")
+        return True
     else:
-        print(f"\n❌ No build.gradle.kts found for validation")
+        print(f"\n❌ Golden files have syntax issues!")
         return False
 
 
-def assemble_project(generated_path):
-    print("\n--- Trying to assemble project ---")
+GRADLE_WRAPPER_PROPERTIES = """distributionBase=GRADLE_USER_HOME
+distributionPath=wrapper/dists
+distributionUrl=https\\://services.gradle.org/distributions/gradle-8.1-bin.zip
+networkTimeout=10000
+zipStoreBase=GRADLE_USER_HOME
+zipStorePath=wrapper/dists"""
+
+# Gradle and Kotlin build state, kept in a workspace between runs; everything else is mirrored from the sources
+WORKSPACE_STATE_DIRS = {"build", ".gradle", ".kotlin"}
+
+# Kotlin compiler ("e: file.kt:1:2 ..."), javac/AAPT ("error: ...") and Gradle's failure summary
+GRADLE_ERROR_PATTERN = re.compile(r'^(?:e: .+|.*\berror: .+|\* What went wrong:)$', re.MULTILINE)
+
+
+def _link_or_copy(source_file, target_file):
+    """Hardlinks a file into the workspace, falling back to a copy across filesystems."""
+    if os.path.exists(target_file):
+        if os.path.samefile(source_file, target_file):
+            return
+        os.remove(target_file)
+    try:
+        os.link(source_file, target_file)
+    except OSError:
+        shutil.copy2(source_file, target_file)
+
+
+def remove_stale_files(workspace_path, expected_files):
+    """Removes workspace files that are no longer in the sources (and then empty folders), keeping Gradle's build state."""
+    expected_files = {os.path.normpath(path) for path in expected_files}
+    removed = 0
+    for root, dirs, files in os.walk(workspace_path, topdown=False):
+        if set(os.path.relpath(root, workspace_path).split(os.sep)) & WORKSPACE_STATE_DIRS:
+            continue
+        for file in files:
+            path = os.path.join(root, file)
+            if os.path.normpath(path) not in expected_files:
+                os.remove(path)
+                removed += 1
+        if root != workspace_path and not os.listdir(root):
+            os.rmdir(root)
+    return removed
+
+
+def prepare_workspace(case_path, generated_path, workspace_path):
+    """Builds the project tree for Gradle from hardlinked sources and the generated build files.
+
+    The workspace is kept between runs so Gradle's incremental state survives; only changed files are relinked,
+    and files that are gone from the sources (e.g. a build file the model no longer generates) are removed.
+    A codebase that only contains source sets (androidMain, commonMain, ...) is placed under composeApp/src.
+    """
+    input_codebase_path = os.path.join(case_path, "input_codebase")
+    is_full_project = os.path.exists(os.path.join(input_codebase_path, "settings.gradle.kts")) or \
+        os.path.isdir(os.path.join(input_codebase_path, "composeApp"))
+    sources_root = workspace_path if is_full_project else os.path.join(workspace_path, "composeApp", "src")
+    expected_files = set()
 
-    # Copy source code to the generated files folder for assembly
-    input_codebase_path = os.path.join(GOLDEN_DATASET_PATH, "input_codebase")
-    
-    # Копируем все файлы из input_codebase в generated_path, не перезаписывая build.gradle.kts
     for root, dirs, files in os.walk(input_codebase_path):
-        # Вычисляем относительный путь от input_codebase
         rel_path = os.path.relpath(root, input_codebase_path)
-        if rel_path == ".":
-            target_dir = generated_path
-        else:
-            target_dir = os.path.join(generated_path, rel_path)
-        
-        # Создаем целевую директорию если её нет
+        target_dir = sources_root if rel_path == "." else os.path.join(sources_root, rel_path)
+        os.makedirs(target_dir, exist_ok=True)
+        for file in files:
+            _link_or_copy(os.path.join(root, file), os.path.join(target_dir, file))
+            expected_files.add(os.path.join(target_dir, file))
+
+    # Generated build files always win over files from the codebase
+    for root, dirs, files in os.walk(generated_path):
+        rel_path = os.path.relpath(root, generated_path)
+        target_dir = workspace_path if rel_path == "." else os.path.join(workspace_path, rel_path)
         os.makedirs(target_dir, exist_ok=True)
-        
-        # Копируем файлы
         for file in files:
-            source_file = os.path.join(root, file)
             target_file = os.path.join(target_dir, file)
-            
-            # Не перезаписываем build.gradle.kts файлы
-            if file == "build.gradle.kts" and os.path.exists(target_file):
-                print(f"Skipping existing build file: {target_file}")
-                continue
-                
-            shutil.copy2(source_file, target_file)
-
-    # Создаем папку для gradle wrapper если её нет
-    wrapper_dir = os.path.join(generated_path, "gradle", "wrapper")
-    os.makedirs(wrapper_dir, exist_ok=True)
-    
-    # Создаем gradle-wrapper.properties если его нет
-    wrapper_props = os.path.join(wrapper_dir, "gradle-wrapper.properties")
+            if os.path.exists(target_file):
+                os.remove(target_file)
+            shutil.copy2(os.path.join(root, file), target_file)
+            expected_files.add(target_file)
+
+    wrapper_props = os.path.join(workspace_path, "gradle", "wrapper", "gradle-wrapper.properties")
+    expected_files.add(wrapper_props)
+    removed = remove_stale_files(workspace_path, expected_files)
+    if removed:
+        print(f"🧹 Removed {removed} stale file(s) from workspace {workspace_path}")
+
     if not os.path.exists(wrapper_props):
+        os.makedirs(os.path.dirname(wrapper_props), exist_ok=True)
         with open(wrapper_props, 'w') as f:
-            f.write("""distributionBase=GRADLE_USER_HOME
-distributionPath=wrapper/dists
-distributionUrl=https\\://services.gradle.org/distributions/gradle-8.1-bin.zip
-networkTimeout=10000
-zipStoreBase=GRADLE_USER_HOME
-zipStorePath=wrapper/dists""")
-    
-    # Проверяем наличие Gradle wrapper
-    gradlew_path = os.path.join(generated_path, "gradlew.bat")
-    if not os.path.exists(gradlew_path):
-        print("gradlew.bat file not found. Trying to use system gradle...")
-        
-        # Попробуем использовать системный gradle
-        try:
-            command = ["gradle", ":composeApp:assembleDebug", "--stacktrace"]
-            process = subprocess.run(
-                command,
-                cwd=generated_path,
-                capture_output=True,
-                text=True,
-                shell=True
-            )
-            
-            if process.returncode == 0:
-                print("\n SUCCESS! Project assembled successfully with system gradle!")
-            else:
-                print("\n FAILURE! Project assembly failed with system gradle.")
-                print("--- Gradle Error ---")
-                print(process.stderr)
-                print("---------------------")
-                
-        except Exception as e:
-            print(f"System gradle also failed: {e}")
-            print("Skipping project assembly - no Gradle available.")
-        
-        return
+            f.write(GRADLE_WRAPPER_PROPERTIES)
+
+
+def gradle_command(workspace_path):
+    """gradlew.bat on Windows when generated, otherwise the system gradle; None if neither is available."""
+    gradlew_path = os.path.join(workspace_path, "gradlew.bat")
+    if os.name == "nt" and os.path.exists(gradlew_path):
+        executable = gradlew_path
+    else:
+        executable = shutil.which("gradle")
+        if executable is None:
+            return None
+    # The daemon stays warm between cases and the build cache is shared through GRADLE_USER_HOME
+    return [executable, ASSEMBLY_TASK, "--daemon", "--build-cache", "--console=plain"]
+
+
+def first_gradle_error(output):
+    match = GRADLE_ERROR_PATTERN.search(output)
+    if match is None:
+        return None
+    if match.group(0) == "* What went wrong:":
+        following = output[match.end():].strip().splitlines()
+        return following[0].strip() if following else match.group(0)
+    return match.group(0).strip()
+
+
+def assemble_project(generated_path, case_path=GOLDEN_DATASET_PATH, timeout=ASSEMBLY_TIMEOUT_SECONDS, workspace_name=None):
+    """Assembles the generated project in its workspace and returns a structured result:
+    {"case", "success", "status" (passed/failed/timeout/no_gradle/error), "first_error", "duration"}
+    """
+    case_name = os.path.basename(os.path.normpath(case_path))
+    print(f"\n--- Trying to assemble project {case_name} ---")
+
+    # Samples of one case need their own workspaces to be built in parallel
+    workspace_path = os.path.join(ASSEMBLY_WORKSPACE_PATH, workspace_name or case_name)
+    result = {"case": case_name, "success": False, "status": "error", "first_error": None, "duration": 0.0}
+    started = time.monotonic()
 
-    # Используем gradlew если он есть
-    command = [gradlew_path, ":composeApp:assembleDebug", "--stacktrace"]
     try:
-        process = subprocess.run(
-            command,
-            cwd=generated_path,
-            capture_output=True,
-            text=True,
-            shell=True
-        )
+        prepare_workspace(case_path, generated_path, workspace_path)
+
+        command = gradle_command(workspace_path)
+        if command is None:
+            print("Skipping project assembly - no Gradle available.")
+            result["status"] = "no_gradle"
+            return result
+
+        env = dict(os.environ, GRADLE_USER_HOME=os.path.abspath(ASSEMBLY_GRADLE_USER_HOME))
+        process = subprocess.run(command, cwd=workspace_path, capture_output=True, text=True, env=env, timeout=timeout)
 
         if process.returncode == 0:
-            print("\n SUCCESS! Project assembled successfully!")
+            print(f"\n SUCCESS! Project {case_name} assembled successfully!")
+            result["success"] = True
+            result["status"] = "passed"
         else:
-            print("\n FAILURE! Project assembly failed.")
-            print("--- Gradle Error ---")
-            print(process.stderr)
-            print("---------------------")
+            result["status"] = "failed"
+            result["first_error"] = first_gradle_error(process.stdout + "\n" + process.stderr)
+            print(f"\n FAILURE! Project {case_name} assembly failed: {result['first_error']}")
 
+    except subprocess.TimeoutExpired:
+        result["status"] = "timeout"
+        result["first_error"] = f"Build timed out after {timeout}s"
+        print(f"\n FAILURE! Project {case_name} assembly timed out.")
     except Exception as e:
-        print(f" Critical error occurred while starting the build: {e}")
\ No newline at end of file
+        result["first_error"] = str(e)
+        print(f" Critical error occurred while starting the build: {e}")
+    finally:
+        result["duration"] = time.monotonic() - started
+        record_span("gradle", result["duration"], case=case_name, status=result["status"])
+
+    return result
+
+
+def assemble_projects(case_paths, max_workers=ASSEMBLY_MAX_PARALLEL_BUILDS):
+    """Assembles the generated/ output of several cases; each build is a separate Gradle process, at most max_workers at a time."""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(assemble_project, os.path.join(case_path, "generated"), case_path) for case_path in case_paths]
+        return [future.result() for future in futures]
@@ -0,0 +1,96 @@
+import io
+import re
+
+# Response sections and the project files they are written to
+SECTION_FILES = {
+    "ROOT_BUILD": "build.gradle.kts",
+    "APP_BUILD": "composeApp/build.gradle.kts",
+    "SETTINGS": "settings.gradle.kts",
+    "GRADLEW": "gradlew.bat",
+}
+
+REQUIRED_SECTIONS = tuple(SECTION_FILES)
+
+START_MARKER_PATTERN = re.compile(r'\[(' + '|'.join(SECTION_FILES) + r')_START\]')
+MAX_MARKER_LENGTH = max(len(f"[{name}_START]") for name in SECTION_FILES)
+
+
+class MarkerStreamParser:
+    """Incremental single-pass parser for [NAME_START] ... [NAME_END] sections of a model response.
+
+    Text is fed chunk by chunk; every character is scanned once, and a section is returned as soon
+    as its END marker, or the START marker of the next section, arrives. The open section is collected
+    in an io.StringIO, so the search buffer only ever holds the new chunk and a marker-sized tail
+    instead of growing with the response.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self._buffer = ""
+        self._section = None
+        self._current = None
+
+    def feed(self, chunk):
+        """Consumes a chunk of response text and returns (name, content) for every section it closes."""
+        self._buffer += chunk
+        closed = []
+
+        while True:
+            if self._current is None:
+                match = START_MARKER_PATTERN.search(self._buffer)
+                if match is None:
+                    # Only a tail that may hold the beginning of a split marker is worth keeping
+                    self._buffer = self._buffer[-MAX_MARKER_LENGTH:]
+                    return closed
+                self._current = match.group(1)
+                self._section = io.StringIO()
+                self._buffer = self._buffer[match.end():]
+            else:
+                end_marker = f"[{self._current}_END]"
+                index = self._buffer.find(end_marker)
+                # A START marker before the END marker closes the open section, so a missing END marker only
+                # loses that section's end instead of swallowing the sections after it
+                next_start = START_MARKER_PATTERN.search(self._buffer, 0, index if index >= 0 else len(self._buffer))
+                if next_start is not None:
+                    self._section.write(self._buffer[:next_start.start()])
+                    closed.append(self._close())
+                    self._buffer = self._buffer[next_start.start():]
+                    continue
+                if index < 0:
+                    # Text that cannot be the start of a split END or START marker moves to the section
+                    keep = max(len(end_marker), MAX_MARKER_LENGTH) - 1
+                    if len(self._buffer) > keep:
+                        self._section.write(self._buffer[:-keep])
+                        self._buffer = self._buffer[-keep:]
+                    return closed
+                self._section.write(self._buffer[:index])
+                closed.append(self._close())
+                self._buffer = self._buffer[index + len(end_marker):]
+
+    def finish(self):
+        """Closes a section left open at the end of the response, returning it as (name, content) or None."""
+        if self._current is None:
+            return None
+        self._section.write(self._buffer)
+        self._buffer = ""
+        return self._close()
+
+    def is_complete(self, required=REQUIRED_SECTIONS):
+        return all(name in self.sections for name in required)
+
+    def _close(self):
+        name = self._current
+        content = self._section.getvalue().strip()
+        self._section = None
+        # The first occurrence of a section wins
+        self.sections.setdefault(name, content)
+        self._current = None
+        return name, content
+
+
+def parse_sections(content):
+    """Parses a complete response in one pass and returns {section name: content}."""
+    parser = MarkerStreamParser()
+    parser.feed(content)
+    parser.finish()
+    return parser.sections
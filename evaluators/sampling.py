@@ -0,0 +1,214 @@
+import math
+import os
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config.constants import DATASET_ROOT_PATH, MAX_PARALLEL_CASES, MAX_INFLIGHT_REQUESTS, SAMPLES_PER_CASE, PROMPT_CACHING
+from evaluators.artifact_scoring import print_results_table, score_samples
+from evaluators.model_evaluator import build_case_prompt, generate_from_prompt
+from evaluators.project_assembler import assemble_project
+from evaluators.static_validator import find_version_catalog, first_validation_error, validate_project
+from util.api_client import AdaptiveConcurrencyLimiter
+from util.folder_helper import ensure_directory_exists, find_dataset_cases, save_generated_files
+from util.response_cache import evict_cache
+from util.instrumentation import finish_run, set_case
+from util.results_store import record_run
+
+# Per-sample metrics summarized as mean/variance: name -> (artifact, metric). The module build carries the
+# dependencies, so text and dependency metrics come from it; score is the weighted case score
+SAMPLE_METRICS = {
+    "score": ("overall", "score"),
+    "similarity": ("composeApp/build.gradle.kts", "similarity"),
+    "bleu": ("composeApp/build.gradle.kts", "bleu"),
+    "dependency_f1": ("composeApp/build.gradle.kts", "dependency_f1"),
+}
+
+
+def pass_at_k(n, c, k):
+    """Unbiased pass@k estimator (Chen et al., 2021): 1 - C(n-c, k) / C(n, k) for c passing samples out of n.
+
+    With fewer than k samples (early stopping) it degrades to "did any sample pass".
+    """
+    if n < k:
+        return 1.0 if c else 0.0
+    if n - c < k:
+        return 1.0
+    return 1.0 - math.comb(n - c, k) / math.comb(n, k)
+
+
+def evaluate_sample(case_path, system_prompt, sample, request_slots, cache_mode, assemble, stop_event, first_sample=None,
+                    early_stop=False):
+    """Draws one sample for a case and decides whether it passes (static validation, then Gradle if enabled).
+
+    Metrics are added by score_case_samples once all samples of the case are drawn. With early_stop a passing
+    sample sets stop_event, so samples that have not started yet are skipped.
+
+    first_sample, if given, is set by sample 0 and the other samples wait for it: once its request is done, so they
+    read the prompt prefix from the API cache instead of each writing it again, or with early_stop once it has
+    passed or failed, so a passing first sample stops them before they call the model.
+    """
+    if first_sample is not None and sample > 0:
+        first_sample.wait()
+    # Sample 0 releases the waiting samples whatever happens, or they would block the case forever
+    try:
+        if stop_event.is_set():
+            return None
+
+        case_name = os.path.basename(case_path)
+        set_case(f"{case_name}/sample_{sample}")
+        sample_path = os.path.join(case_path, "samples", f"sample_{sample}")
+        ensure_directory_exists(sample_path)
+
+        stats = {}
+        root_build, app_build, settings = generate_from_prompt(system_prompt, sample_path, request_slots, cache_mode=cache_mode, sample=sample,
+                                                               stats=stats)
+        if first_sample is not None and sample == 0 and not early_stop:
+            first_sample.set()
+        if root_build is None or app_build is None or settings is None:
+            return {"sample": sample, "generated": False, "passed": False, "first_error": "generation failed", "metrics": {},
+                    "generation": stats}
+
+        save_generated_files(sample_path, root_build, app_build, settings)
+
+        catalog_path = find_version_catalog(sample_path, os.path.join(case_path, "golden_output"), os.path.join(case_path, "input_codebase"))
+        validation = validate_project(sample_path, catalog_path)
+        passed = validation["passed"]
+        first_error = first_validation_error(validation)
+
+        if passed and assemble:
+            assembly = assemble_project(sample_path, case_path, workspace_name=f"{case_name}_sample_{sample}")
+            passed = assembly["success"]
+            first_error = assembly["first_error"]
+
+        if passed and early_stop:
+            stop_event.set()
+        return {"sample": sample, "generated": True, "passed": passed, "first_error": first_error, "metrics": {}, "generation": stats,
+                "path": sample_path}
+    finally:
+        if first_sample is not None and sample == 0:
+            first_sample.set()
+
+
+def score_case_samples(case_path, samples):
+    """Scores all generated samples of a case together, so each golden reference is indexed once for the k candidates."""
+    generated = [s for s in samples if s["generated"]]
+    for sample, metrics in zip(generated, score_samples(case_path, [s["path"] for s in generated])):
+        metrics["pass"] = {"passed": 1.0 if sample["passed"] else 0.0}
+        sample["metrics"] = metrics
+
+    if generated:
+        case_name = os.path.basename(case_path)
+        print()
+        print_results_table([(f"{case_name}/sample_{s['sample']}", s["metrics"]) for s in generated])
+
+
+def summarize_samples(case_name, samples, k):
+    """pass@1, pass@k and mean/variance of the sample metrics."""
+    n = len(samples)
+    c = sum(1 for s in samples if s["passed"])
+    summary = {"case": case_name, "n": n, "c": c, "pass@1": pass_at_k(n, c, 1), f"pass@{k}": pass_at_k(n, c, k)}
+
+    for name, (artifact, metric) in SAMPLE_METRICS.items():
+        values = [s["metrics"][artifact][metric] for s in samples if metric in s["metrics"].get(artifact, {})]
+        summary[f"{name}_mean"] = statistics.fmean(values) if values else 0.0
+        summary[f"{name}_variance"] = statistics.pvariance(values) if len(values) > 1 else 0.0
+
+    return summary
+
+
+def evaluate_case_samples(case_path, k, request_slots, cache_mode=None, early_stop=False, assemble=False):
+    """Draws k samples of one case concurrently; with early_stop no new samples start once one has passed."""
+    case_name = os.path.basename(case_path)
+    set_case(case_name)
+
+    # The prompt is rendered once and shared by all samples
+    system_prompt = build_case_prompt(case_path)
+    if system_prompt is None:
+        print(f"No source code found in {case_path}. Skipping case.")
+        return {"case": case_name, "status": "no_sources", "samples": [], "summary": summarize_samples(case_name, [], k)}
+
+    stop_event = threading.Event()
+    first_sample = threading.Event() if (PROMPT_CACHING or early_stop) and k > 1 else None
+    samples = []
+
+    # No more workers than in-flight requests, so queued samples still see the stop flag
+    with ThreadPoolExecutor(max_workers=min(k, MAX_INFLIGHT_REQUESTS)) as pool:
+        futures = {pool.submit(evaluate_sample, case_path, system_prompt, sample, request_slots, cache_mode, assemble, stop_event, first_sample,
+                               early_stop): sample
+                   for sample in range(k)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Sample {futures[future]} of {case_name} failed: {e}")
+                result = {"sample": futures[future], "status": "error", "generated": False, "passed": False, "first_error": str(e),
+                          "metrics": {}, "generation": {}}
+            if result is not None:
+                samples.append(result)
+
+    samples.sort(key=lambda s: s["sample"])
+    score_case_samples(case_path, samples)
+    return {"case": case_name, "status": "ok", "samples": samples, "summary": summarize_samples(case_name, samples, k)}
+
+
+def run_pass_at_k(dataset_root=DATASET_ROOT_PATH, k=None, max_workers=None, max_inflight_requests=None, cache_mode=None,
+                  early_stop=False, assemble=False, cases=None):
+    """Evaluates every case (or only the given case folders) with k samples and prints pass@k and metric mean/variance per case."""
+    k = k or SAMPLES_PER_CASE
+    max_workers = max_workers or MAX_PARALLEL_CASES
+    request_slots = AdaptiveConcurrencyLimiter(max_inflight_requests or MAX_INFLIGHT_REQUESTS)
+
+    evict_cache()
+
+    cases = find_dataset_cases(dataset_root) if cases is None else cases
+    if not cases:
+        print(f"❌ No cases found in {dataset_root}")
+        return []
+
+    print(f"🎲 Drawing {k} sample(s) for each of {len(cases)} case(s)")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(evaluate_case_samples, case_path, k, request_slots, cache_mode, early_stop, assemble): case_path for case_path in cases}
+        results = []
+        for future in as_completed(futures):
+            case_name = os.path.basename(futures[future])
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"❌ Case {case_name} failed: {e}")
+                results.append({"case": case_name, "status": "error", "samples": [], "summary": summarize_samples(case_name, [], k)})
+
+    results.sort(key=lambda r: r["case"])
+
+    print_pass_at_k_report(results, k)
+    rows = [{"case": result["case"], "sample": sample["sample"],
+             "status": sample.get("status", "ok" if sample["generated"] else "generation_failed"),
+             "metrics": sample["metrics"], "generation": sample["generation"]}
+            for result in results for sample in result["samples"]]
+    rows += [{"case": result["case"], "status": "error", "metrics": {}} for result in results if result["status"] == "error"]
+    record_run("samples", rows)
+    finish_run()
+    return results
+
+
+def print_pass_at_k_report(results, k):
+    print("\n" + "=" * 60)
+    print(f"📋 PASS@{k} REPORT")
+    print("=" * 60)
+
+    for result in results:
+        summary = result["summary"]
+        if result["status"] == "error":
+            print(f"{summary['case']}: ❌ failed")
+            continue
+        metrics = ", ".join(f"{name}={summary[f'{name}_mean']:.3f}±{math.sqrt(summary[f'{name}_variance']):.3f}" for name in SAMPLE_METRICS)
+        print(f"{summary['case']}: n={summary['n']} c={summary['c']} pass@1={summary['pass@1']:.3f} "
+              f"pass@{k}={summary[f'pass@{k}']:.3f} {metrics}")
+        for sample in result["samples"]:
+            if not sample["passed"] and sample["first_error"]:
+                print(f"   sample {sample['sample']}: {sample['first_error']}")
+
+    if results:
+        print(f"\n📊 Mean pass@1: {statistics.fmean(r['summary']['pass@1'] for r in results):.3f}, "
+              f"pass@{k}: {statistics.fmean(r['summary'][f'pass@{k}'] for r in results):.3f}")
@@ -0,0 +1,265 @@
+"""
+Sharded corpus evaluation across several worker processes or machines.
+
+Cases are partitioned deterministically by a hash of their name (--shard i/N). Workers share a queue folder
+on shared storage: a case is claimed by atomically creating claims/<case>.claim, so a worker that has run out
+of cases in its own shard steals unclaimed cases of the other shards. Every worker generates, scores and
+(optionally) assembles each case like run_corpus and writes its result file as soon as the case is done, so a
+worker that dies only loses the cases it was working on. While a case is in progress its claim is refreshed
+every SHARD_HEARTBEAT_SECONDS. merge_shards() combines the results into one corpus report and one stored run.
+
+    python main.py generate --all-cases --shard 1/3 --queue /shared/kmpeval-queue &
+    python main.py generate --all-cases --shard 2/3 --queue /shared/kmpeval-queue &
+    python main.py generate --all-cases --shard 3/3 --queue /shared/kmpeval-queue &
+    wait; python main.py merge --queue /shared/kmpeval-queue
+
+Use a fresh queue folder per run: cases that already have a result in it are not evaluated again, which resumes
+an interrupted run. Workers refuse a queue whose run has already been merged.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.constants import (DATASET_ROOT_PATH, MAX_PARALLEL_CASES, MAX_INFLIGHT_REQUESTS, ASSEMBLY_MAX_PARALLEL_BUILDS, SHARD_QUEUE_PATH,
+                              SHARD_HEARTBEAT_SECONDS, SHARD_CLAIM_TIMEOUT_SECONDS)
+from evaluators.artifact_scoring import score_case
+from evaluators.corpus_runner import add_assembly_results, evaluate_case, print_corpus_report
+from util.api_client import AdaptiveConcurrencyLimiter
+from util.atomic_file import write_json_atomic
+from util.folder_helper import find_dataset_cases
+from util.instrumentation import finish_run, load_trace
+from util.response_cache import evict_cache
+from util.results_store import record_run
+
+
+def parse_shard(text):
+    """Parses a 1-based "i/N" shard into a zero-based (index, count)."""
+    try:
+        number, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {text!r}")
+    if not 1 <= number <= count:
+        raise ValueError(f"Shard {number} is outside 1..{count}")
+    return number - 1, count
+
+
+def shard_of(case_name, shard_count):
+    """Shard of a case; hashing the name keeps every other case in place when cases are added or removed."""
+    return int(hashlib.sha1(case_name.encode("utf-8")).hexdigest(), 16) % shard_count
+
+
+def shard_cases(cases, shard_index, shard_count):
+    return [case_path for case_path in cases if shard_of(os.path.basename(case_path), shard_count) == shard_index]
+
+
+class WorkQueue:
+    """File-lock work queue in a shared folder.
+
+    claims/<case>.claim is created with O_EXCL, so exactly one worker gets each case; results/<case>.json
+    marks it done. Claims not refreshed for claim_timeout without a result belong to a dead worker and are taken
+    over. merged.json marks a queue whose run has been merged.
+    """
+
+    def __init__(self, queue_path=SHARD_QUEUE_PATH, worker_id=None, claim_timeout=SHARD_CLAIM_TIMEOUT_SECONDS):
+        self.queue_path = queue_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_timeout = claim_timeout
+        for folder in ("claims", "results", "traces"):
+            os.makedirs(os.path.join(queue_path, folder), exist_ok=True)
+
+    def _path(self, folder, name, extension):
+        return os.path.join(self.queue_path, folder, f"{name}.{extension}")
+
+    def is_done(self, case_name):
+        return os.path.exists(self._path("results", case_name, "json"))
+
+    def claim(self, case_name):
+        """Claims a case for this worker; False if it is done or another worker holds a live claim."""
+        if self.is_done(case_name):
+            return False
+
+        claim_path = self._path("claims", case_name, "claim")
+        try:
+            fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._expire(claim_path):
+                return False
+            try:
+                fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                return False
+
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"worker": self.worker_id, "claimed_at": time.time()}, f)
+        return True
+
+    def heartbeat(self, case_name):
+        """Refreshes the claim of a case in progress, so other workers do not take it over."""
+        try:
+            os.utime(self._path("claims", case_name, "claim"))
+        except OSError:
+            pass
+
+    def _expire(self, claim_path):
+        """Removes a claim older than claim_timeout; of several workers only the one whose rename succeeds removes it."""
+        try:
+            if time.time() - os.path.getmtime(claim_path) < self.claim_timeout:
+                return False
+            stale_path = f"{claim_path}.{self.worker_id}.stale"
+            os.rename(claim_path, stale_path)
+            os.remove(stale_path)
+        except OSError:
+            return False
+        print(f"♻️ Taking over expired claim {os.path.basename(claim_path)}")
+        return True
+
+    def complete(self, result):
+        """Stores the result of a claimed case, which marks it done."""
+        write_json_atomic(self._path("results", result["case"], "json"), result, indent=1)
+
+    def merged_path(self):
+        return os.path.join(self.queue_path, "merged.json")
+
+    def mark_merged(self, run_id):
+        write_json_atomic(self.merged_path(), {"run_id": run_id, "merged_at": time.time()})
+
+    def results(self):
+        results = []
+        folder = os.path.join(self.queue_path, "results")
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".json"):
+                with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                    results.append(json.load(f))
+        return results
+
+    def trace_path(self):
+        return self._path("traces", self.worker_id, "json")
+
+    def trace_paths(self):
+        folder = os.path.join(self.queue_path, "traces")
+        return [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith(".json")]
+
+
+def run_shard_worker(shard, queue_path=SHARD_QUEUE_PATH, dataset_root=DATASET_ROOT_PATH, steal=True, max_workers=None,
+                     max_inflight_requests=None, cache_mode=None, stream=None, assemble=False):
+    """Evaluates the cases of one shard (index, count), then steals unclaimed cases of other shards unless steal=False.
+
+    Results are written to the queue folder instead of being stored as a run; see merge_shards. Raises ValueError
+    for a queue whose run has already been merged.
+    """
+    shard_index, shard_count = shard
+    max_workers = max_workers or MAX_PARALLEL_CASES
+    queue = WorkQueue(queue_path)
+    if os.path.exists(queue.merged_path()):
+        raise ValueError(f"Queue {queue_path} belongs to a run that was already merged; use a fresh --queue folder per run")
+
+    cases = find_dataset_cases(dataset_root)
+    own_cases = shard_cases(cases, shard_index, shard_count)
+    # Other shards are visited starting with the next one, so idle workers do not all steal from the same shard
+    other_cases = sorted((case_path for case_path in cases if case_path not in own_cases),
+                         key=lambda case_path: ((shard_of(os.path.basename(case_path), shard_count) - shard_index) % shard_count, case_path))
+    order = own_cases + (other_cases if steal else [])
+
+    print(f"🧩 Worker {queue.worker_id}: shard {shard_index + 1}/{shard_count} with {len(own_cases)} of {len(cases)} case(s)"
+          f"{', stealing from other shards' if steal else ''}")
+
+    evict_cache()
+    request_slots = AdaptiveConcurrencyLimiter(max_inflight_requests or MAX_INFLIGHT_REQUESTS)
+    assembly_slots = threading.BoundedSemaphore(ASSEMBLY_MAX_PARALLEL_BUILDS)
+    pending = iter(order)
+    pending_lock = threading.Lock()
+    in_progress = set()
+
+    def next_claimed_case():
+        with pending_lock:
+            for case_path in pending:
+                if queue.claim(os.path.basename(case_path)):
+                    in_progress.add(os.path.basename(case_path))
+                    return case_path
+        return None
+
+    def evaluate(case_path):
+        result = evaluate_case(case_path, request_slots, cache_mode, stream)
+        if result["status"] == "ok":
+            result["metrics"] = {**score_case(case_path, os.path.join(case_path, "generated")), **result["metrics"]}
+            if assemble:
+                with assembly_slots:
+                    add_assembly_results([result], dataset_root)
+        return result
+
+    def work():
+        results = []
+        while True:
+            case_path = next_claimed_case()
+            if case_path is None:
+                return results
+            case_name = os.path.basename(case_path)
+            try:
+                result = evaluate(case_path)
+            except Exception as e:
+                print(f"❌ Case {case_name} failed: {e}")
+                result = {"case": case_name, "status": "error", "metrics": {}}
+            queue.complete(result)
+            with pending_lock:
+                in_progress.discard(case_name)
+            results.append(result)
+
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(SHARD_HEARTBEAT_SECONDS):
+            with pending_lock:
+                case_names = list(in_progress)
+            for case_name in case_names:
+                queue.heartbeat(case_name)
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(work) for _ in range(max_workers)]
+            results = [result for future in futures for result in future.result()]
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+
+    results.sort(key=lambda r: r["case"])
+    own_names = {os.path.basename(case_path) for case_path in own_cases}
+    stolen = sum(1 for result in results if result["case"] not in own_names)
+    print(f"✅ Worker {queue.worker_id} finished {len(results)} case(s), {stolen} stolen from other shards")
+    finish_run(queue.trace_path())
+    return results
+
+
+def merge_shards(queue_path=SHARD_QUEUE_PATH, dataset_root=DATASET_ROOT_PATH):
+    """Combines the results and traces of all shard workers into one corpus report, one stored run and one trace.
+
+    Dataset cases without a result (e.g. a worker died after claiming them) are reported as not_evaluated.
+    """
+    queue = WorkQueue(queue_path)
+    results = queue.results()
+
+    evaluated = {result["case"] for result in results}
+    if os.path.isdir(dataset_root):
+        for case_path in find_dataset_cases(dataset_root):
+            if os.path.basename(case_path) not in evaluated:
+                results.append({"case": os.path.basename(case_path), "status": "not_evaluated", "metrics": {}})
+    results.sort(key=lambda r: r["case"])
+
+    if not results:
+        print(f"❌ No shard results found in {queue_path}")
+        return []
+
+    trace_paths = queue.trace_paths()
+    for path in trace_paths:
+        load_trace(path)
+    print(f"🧩 Merging {len(evaluated)} case result(s) from {len(trace_paths)} worker(s)")
+
+    print_corpus_report(results)
+    queue.mark_merged(record_run("corpus", results))
+    finish_run()
+    return results
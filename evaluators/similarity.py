@@ -0,0 +1,410 @@
+"""
+Similarity engine for generated vs golden files.
+
+Modes:
+  difflib - character-level difflib.SequenceMatcher, the original metric
+  char    - character-level Myers diff
+  token   - Myers diff over identifier/punctuation tokens (whitespace ignored)
+  line    - Myers diff over lines
+  ngram   - Dice coefficient over character n-gram counts, NumPy-vectorized for batch scoring when available
+
+Accuracy against the original ratio: all Myers modes use the same formula as SequenceMatcher.ratio(),
+2 * matches / total elements, but with an optimal (longest common subsequence) matching. SequenceMatcher
+recursively picks the longest matching blocks and junks popular characters, which can only find fewer
+matches, so for "char" mode ratio >= difflib ratio holds, and the two are equal whenever SequenceMatcher's
+matching is optimal. The matching is exact while the inputs differ in at most SIMILARITY_GREEDY_MAX_DIFF
+elements; beyond that the diff trades optimality for bounded time and memory. `python -m benchmarks.run_benchmarks
+--verify` checks the matching against a brute-force LCS and difflib. "token" and "line" ratios measure the same overlap at a coarser
+granularity; they are not bounded by the character ratio but track it closely on Gradle files, where
+differences are whole identifiers or lines.
+"""
+import re
+import zlib
+from collections import Counter
+
+from config.constants import SIMILARITY_GREEDY_MAX_DIFF, SIMILARITY_MAX_DIFF_COST
+from util.lazy_imports import optional_module
+
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+NGRAM_SIZE = 3
+NGRAM_BUCKETS = 1 << 16
+
+# The greedy Myers search checks its progress after this fraction of its step budget, see _greedy_blocks
+GREEDY_PROBE_FRACTION = 16
+
+
+def tokenize(text, mode):
+    if mode == "line":
+        return text.splitlines()
+    if mode == "token":
+        return TOKEN_PATTERN.findall(text)
+    return list(text)
+
+
+def _intern(a, b):
+    """Maps elements of both sequences to small ints so the diff loop compares ints only."""
+    ids = {}
+    return [ids.setdefault(x, len(ids)) for x in a], [ids.setdefault(x, len(ids)) for x in b]
+
+
+def _greedy_blocks(a, b, max_d):
+    """Matching blocks of an optimal alignment from Myers' greedy forward search, tracing the path back through a
+    copy of V per step; None if the sequences differ in more than max_d elements.
+
+    Fastest for similar inputs, but the trace is O(D^2), so it only runs up to a bounded D. After max_d /
+    GREEDY_PROBE_FRACTION steps, the progress of the furthest-reaching path is extrapolated to the whole input;
+    inputs that would need more than twice max_d steps at that rate are given up right away, instead of after
+    max_d steps. Inputs of at most 2 * max_d elements never are.
+    """
+    n, m = len(a), len(b)
+    probe_d = max_d // GREEDY_PROBE_FRACTION
+    max_d = min(max_d, n + m)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    final_d = None
+
+    for d in range(max_d + 1):
+        # State before step d, indexed by k + d
+        trace.append(v[offset - d:offset + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                final_d = d
+                break
+        if final_d is not None:
+            break
+        if d == probe_d:
+            furthest = max(2 * v[offset + k] - k for k in range(-d, d + 1, 2))
+            if probe_d * (n + m) > 2 * max_d * furthest:
+                return None
+    if final_d is None:
+        return None
+
+    blocks = []
+    x, y = n, m
+    for d in range(final_d, 0, -1):
+        snapshot = trace[d]
+        k = x - y
+        if k == -d or (k != d and snapshot[k - 1 + d] < snapshot[k + 1 + d]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = snapshot[prev_k + d]
+        prev_y = prev_x - prev_k
+        if prev_k == k + 1:
+            mid_x, mid_y = prev_x, prev_y + 1
+        else:
+            mid_x, mid_y = prev_x + 1, prev_y
+        if x > mid_x:
+            blocks.append((mid_x, mid_y, x - mid_x))
+        x, y = prev_x, prev_y
+    if x > 0:
+        blocks.append((0, 0, x))
+
+    blocks.reverse()
+    return blocks
+
+
+def _middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, max_cost=SIMILARITY_MAX_DIFF_COST):
+    """Point (x, y), relative to (a_lo, b_lo), where an optimal path of a[a_lo:a_hi] vs b[b_lo:b_hi] crosses its middle.
+
+    Forward and reverse Myers searches run until their furthest-reaching paths overlap, keeping only two V arrays.
+    After max_cost steps without meeting, the furthest-reaching forward point is returned instead, which keeps the
+    matching valid but no longer optimal. Returns None when the ranges have nothing in common.
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    # Local copies (and reversed ones for the reverse search) keep index arithmetic out of the snake loops
+    a, b = a[a_lo:a_hi], b[b_lo:b_hi]
+    reversed_a, reversed_b = a[::-1], b[::-1]
+    max_cost = max(max_cost, 1)
+    max_d = min((n + m + 1) // 2, max_cost + 1)
+    offset = max_d + 1
+    size = 2 * max_d + 3
+    forward = [-1] * size
+    reverse = [-1] * size
+    forward[offset + 1] = 0
+    reverse[offset + 1] = 0
+    delta = n - m
+    # With an odd delta the paths meet on a forward step, otherwise on a reverse step
+    odd = delta % 2 != 0
+    # Diagonals that ran off the edit graph are skipped from then on
+    k1_start = k1_end = k2_start = k2_end = 0
+
+    best = None
+    for d in range(max_d + 1):
+        if d > max_cost and best is not None:
+            return best
+        best = None
+        for k in range(-d + k1_start, d + 1 - k1_end, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if x > n:
+                k1_end += 2
+            elif y > m:
+                k1_start += 2
+            else:
+                if x + y < n + m and (best is None or x + y > best[0] + best[1]):
+                    best = x, y
+                if odd:
+                    reverse_k = offset + delta - k
+                    if 0 <= reverse_k < size and reverse[reverse_k] != -1 and x >= n - reverse[reverse_k]:
+                        return x, y
+
+        for k in range(-d + k2_start, d + 1 - k2_end, 2):
+            if k == -d or (k != d and reverse[offset + k - 1] < reverse[offset + k + 1]):
+                x = reverse[offset + k + 1]
+            else:
+                x = reverse[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and reversed_a[x] == reversed_b[y]:
+                x += 1
+                y += 1
+            reverse[offset + k] = x
+            if x > n:
+                k2_end += 2
+            elif y > m:
+                k2_start += 2
+            elif not odd:
+                forward_k = offset + delta - k
+                if 0 <= forward_k < size and forward[forward_k] != -1:
+                    forward_x = forward[forward_k]
+                    if forward_x >= n - x:
+                        return forward_x, forward_x - (forward_k - offset)
+    return best
+
+
+def _myers_blocks(a, b, greedy_max_d=SIMILARITY_GREEDY_MAX_DIFF, max_cost=SIMILARITY_MAX_DIFF_COST):
+    """Matching blocks (i, j, size) of an alignment, optimal while a and b differ in at most greedy_max_d elements.
+
+    Such inputs go through the greedy search. Beyond that, Myers' linear-space divide and conquer takes over:
+    each subproblem drops its common prefix and suffix and is split at its middle snake. Memory is
+    O(N + M + greedy_max_d^2); time is O((N + M) D), with D capped per subproblem by max_cost.
+    """
+    blocks = _greedy_blocks(a, b, greedy_max_d)
+    if blocks is not None:
+        return blocks
+
+    blocks = []
+    pending = [(0, len(a), 0, len(b))]
+    while pending:
+        a_lo, a_hi, b_lo, b_hi = pending.pop()
+        start = a_lo
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        if a_lo > start:
+            blocks.append((start, b_lo - (a_lo - start), a_lo - start))
+        end = a_hi
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+        if a_hi < end:
+            blocks.append((a_hi, b_hi, end - a_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        split = _middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, max_cost)
+        if split is None:
+            continue
+        x, y = split
+        pending.append((a_lo, a_lo + x, b_lo, b_lo + y))
+        pending.append((a_lo + x, a_hi, b_lo + y, b_hi))
+
+    blocks.sort()
+    return blocks
+
+
+def matching_blocks(a, b, greedy_max_d=SIMILARITY_GREEDY_MAX_DIFF, max_cost=SIMILARITY_MAX_DIFF_COST):
+    """Matching blocks of two sequences, in the format of SequenceMatcher.get_matching_blocks() (with the sentinel).
+
+    greedy_max_d and max_cost bound the diff, see _myers_blocks.
+    """
+    a, b = _intern(a, b)
+    la, lb = len(a), len(b)
+
+    # Common prefix and suffix do not need the diff loop
+    prefix = 0
+    while prefix < la and prefix < lb and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < la - prefix and suffix < lb - prefix and a[la - 1 - suffix] == b[lb - 1 - suffix]:
+        suffix += 1
+
+    blocks = []
+    if prefix:
+        blocks.append((0, 0, prefix))
+    for i, j, size in _myers_blocks(a[prefix:la - suffix], b[prefix:lb - suffix], greedy_max_d, max_cost):
+        blocks.append((i + prefix, j + prefix, size))
+    if suffix:
+        blocks.append((la - suffix, lb - suffix, suffix))
+
+    merged = []
+    for block in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == block[0] and merged[-1][1] + merged[-1][2] == block[1]:
+            i, j, size = merged[-1]
+            merged[-1] = (i, j, size + block[2])
+        else:
+            merged.append(block)
+    merged.append((la, lb, 0))
+    return merged
+
+
+def opcodes_from_blocks(blocks):
+    """Converts matching blocks into SequenceMatcher-style opcodes."""
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in blocks:
+        if i < ai and j < bj:
+            opcodes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(("insert", i, ai, j, bj))
+        if size:
+            opcodes.append(("equal", ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return opcodes
+
+
+def ratio_from_blocks(blocks, la, lb):
+    if la + lb == 0:
+        return 1.0
+    return 2.0 * sum(size for _, _, size in blocks) / (la + lb)
+
+
+def diff_sequences(a, b):
+    """Diffs two sequences once and returns (ratio, opcodes), so the ratio and the diff output share one pass."""
+    blocks = matching_blocks(a, b)
+    return ratio_from_blocks(blocks, len(a), len(b)), opcodes_from_blocks(blocks)
+
+
+def grouped_opcodes(opcodes, n=3):
+    """Port of SequenceMatcher.get_grouped_opcodes() working on precomputed opcodes."""
+    codes = list(opcodes)
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    nn = n + n
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start, stop):
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff_lines(a, b, opcodes, n=3):
+    """Same output as difflib.unified_diff(a, b, lineterm='') but built from precomputed opcodes."""
+    started = False
+    for group in grouped_opcodes(opcodes, n):
+        if not started:
+            started = True
+            yield "--- "
+            yield "+++ "
+        first, last = group[0], group[-1]
+        yield f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield " " + line
+                continue
+            if tag in ("replace", "delete"):
+                for line in a[i1:i2]:
+                    yield "-" + line
+            if tag in ("replace", "insert"):
+                for line in b[j1:j2]:
+                    yield "+" + line
+
+
+def _ngram_counts(text, n=NGRAM_SIZE):
+    return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def ngram_similarity(text1, text2, n=NGRAM_SIZE):
+    """Dice coefficient of character n-gram multisets."""
+    counts1, counts2 = _ngram_counts(text1, n), _ngram_counts(text2, n)
+    total = sum(counts1.values()) + sum(counts2.values())
+    if total == 0:
+        return 1.0 if text1 == text2 else 0.0
+    return 2.0 * sum((counts1 & counts2).values()) / total
+
+
+def _hashed_ngram_vector(numpy, text, n, buckets):
+    ids = [zlib.crc32(text[i:i + n].encode("utf-8")) % buckets for i in range(len(text) - n + 1)]
+    return numpy.bincount(numpy.asarray(ids, dtype=numpy.int64), minlength=buckets)
+
+
+def ngram_similarity_matrix(references, candidates, n=NGRAM_SIZE, buckets=NGRAM_BUCKETS):
+    """Scores every candidate against every reference, returning rows of Dice coefficients (references x candidates).
+
+    With NumPy the n-gram counts are hashed into fixed-size vectors and compared in one vectorized step per
+    reference; hash collisions can only raise a score, and only marginally with the default bucket count.
+    Without NumPy it falls back to exact pairwise ngram_similarity().
+    """
+    numpy = optional_module("numpy")
+    if numpy is None:
+        return [[ngram_similarity(reference, candidate, n) for candidate in candidates] for reference in references]
+
+    if not candidates:
+        return [[] for _ in references]
+
+    candidate_matrix = numpy.stack([_hashed_ngram_vector(numpy, candidate, n, buckets) for candidate in candidates])
+    candidate_totals = candidate_matrix.sum(axis=1)
+
+    rows = []
+    for reference in references:
+        reference_vector = _hashed_ngram_vector(numpy, reference, n, buckets)
+        common = numpy.minimum(candidate_matrix, reference_vector).sum(axis=1)
+        totals = candidate_totals + reference_vector.sum()
+        scores = numpy.where(totals > 0, 2.0 * common / numpy.maximum(totals, 1), 0.0)
+        # Texts shorter than n have no n-grams; like ngram_similarity(), they match only when they are equal
+        rows.append([score if total else float(reference == candidate)
+                     for score, total, candidate in zip(scores.tolist(), totals.tolist(), candidates)])
+    return rows
+
+
+def similarity_ratio(text1, text2, mode="token"):
+    if mode == "difflib":
+        from difflib import SequenceMatcher
+        return SequenceMatcher(None, text1, text2).ratio()
+    if mode == "ngram":
+        return ngram_similarity(text1, text2)
+    a, b = tokenize(text1, mode), tokenize(text2, mode)
+    return ratio_from_blocks(matching_blocks(a, b), len(a), len(b))
@@ -0,0 +1,166 @@
+"""
+Tier-0 static validation of Kotlin DSL build files.
+
+Runs in milliseconds and filters out most broken candidates before the expensive Gradle tier:
+balanced blocks (braces inside strings and comments are ignored), required top-level blocks per
+file role, and resolution of every libs.* accessor against gradle/libs.versions.toml.
+"""
+import os
+
+from config.constants import SCORING_MAX_FILE_BYTES
+from evaluators.gradle_parser import TOKEN_PATTERN, load_version_catalog
+from util.file_index import read_text_file
+from util.instrumentation import span
+
+# Top-level blocks each file role must declare
+REQUIRED_BLOCKS = {
+    "root": ["plugins"],
+    "app": ["plugins", "kotlin", "android"],
+}
+
+BRACKET_PAIRS = {"}": "{", ")": "(", "]": "["}
+CATALOG_ACCESSOR_METHODS = {"get", "asProvider"}
+
+
+def file_role(relative_path, content):
+    """Role of a build file: settings, app (module build) or root."""
+    if relative_path.endswith("settings.gradle.kts"):
+        return "settings"
+    if "/" in relative_path:
+        return "app"
+    # golden_output keeps the module build file at the top level
+    return "app" if "android {" in content or "\nandroid{" in content else "root"
+
+
+def lex_gradle_file(content):
+    """Single pass over the file: returns (bracket errors, top-level block names, libs.* accessors with line numbers)."""
+    errors = []
+    stack = []
+    top_level_blocks = set()
+    accessors = []
+    last_name = None
+    line = 1
+    position = 0
+
+    for match in TOKEN_PATTERN.finditer(content):
+        kind = match.lastgroup
+        value = match.group(kind)
+        line += content.count("\n", position, match.start())
+        position = match.start()
+        if kind in ("comment", "string"):
+            continue
+
+        if kind == "name":
+            last_name = value
+            if value.startswith("libs."):
+                accessors.append((value, line))
+        elif value in ("{", "(", "["):
+            if value == "{" and not any(opening == "{" for opening, _ in stack) and last_name:
+                top_level_blocks.add(last_name)
+            stack.append((value, line))
+        elif value in BRACKET_PAIRS:
+            if not stack:
+                errors.append(f"line {line}: unexpected '{value}'")
+            elif stack[-1][0] != BRACKET_PAIRS[value]:
+                errors.append(f"line {line}: '{value}' closes '{stack[-1][0]}' opened on line {stack[-1][1]}")
+                stack.pop()
+            else:
+                stack.pop()
+
+    for opening, line in stack:
+        errors.append(f"line {line}: '{opening}' is never closed")
+
+    return errors, top_level_blocks, accessors
+
+
+def unresolved_catalog_accessors(accessors, catalog):
+    """Returns libs.* accessors that do not exist in the version catalog."""
+    unresolved = []
+    for accessor, line in accessors:
+        parts = accessor.split(".")[1:]
+        if parts and parts[-1] in CATALOG_ACCESSOR_METHODS:
+            parts = parts[:-1]
+
+        section = "libraries"
+        if parts and parts[0] in ("plugins", "versions", "bundles"):
+            section, parts = parts[0], parts[1:]
+
+        if ".".join(parts) not in catalog[section]:
+            unresolved.append(f"line {line}: {accessor} is not defined in the version catalog")
+    return unresolved
+
+
+def find_version_catalog(*project_paths):
+    """Returns the first gradle/libs.versions.toml found in the given project folders, or None."""
+    for project_path in project_paths:
+        path = os.path.join(project_path, "gradle", "libs.versions.toml")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def validate_build_file(relative_path, content, catalog=None):
+    """Tier-0 checks of a single file; returns a list of error messages."""
+    errors, top_level_blocks, accessors = lex_gradle_file(content)
+    role = file_role(relative_path, content)
+
+    for block in REQUIRED_BLOCKS.get(role, []):
+        if block not in top_level_blocks:
+            errors.append(f"missing {block} {{ }} block")
+
+    if role == "settings" and "rootProject.name" not in content and "include(" not in content:
+        errors.append("settings declare neither rootProject.name nor include()")
+
+    if catalog is not None:
+        errors.extend(unresolved_catalog_accessors(accessors, catalog))
+
+    return errors
+
+
+def validate_project(project_path, catalog_path=None):
+    """Runs tier 0 over every build file of a project folder (generated/ or golden_output).
+
+    Returns {"passed", "files": {relative_path: [errors]}, "catalog"}; libs.* references are only
+    checked when a version catalog is available.
+    """
+    with span("validate"):
+        catalog_path = catalog_path or find_version_catalog(project_path)
+        catalog = load_version_catalog(catalog_path) if catalog_path else None
+
+        files = {}
+        for relative_path in ("build.gradle.kts", "composeApp/build.gradle.kts", "settings.gradle.kts"):
+            file_path = os.path.join(project_path, *relative_path.split("/"))
+            if not os.path.exists(file_path):
+                continue
+            files[relative_path] = validate_build_file(relative_path, read_text_file(file_path, SCORING_MAX_FILE_BYTES), catalog)
+
+    if not files:
+        files["build.gradle.kts"] = ["no build files found"]
+
+    return {
+        "passed": not any(files.values()),
+        "files": files,
+        "catalog": catalog_path,
+    }
+
+
+def first_validation_error(validation):
+    for relative_path, errors in validation["files"].items():
+        if errors:
+            return f"{relative_path}: {errors[0]}"
+    return None
+
+
+def print_validation_report(validations):
+    """Prints the tier-0 outcome of every (name, validation) pair with all errors of failed files."""
+    for name, validation in validations:
+        if validation["passed"]:
+            print(f"✅ {name}: static validation passed")
+            continue
+        print(f"❌ {name}: static validation failed")
+        for relative_path, errors in validation["files"].items():
+            for error in errors:
+                print(f"   {relative_path}: {error}")
+
+    passed = sum(1 for _, validation in validations if validation["passed"])
+    print(f"\n🧪 Passed: {passed}/{len(validations)}")
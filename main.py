@@ -1,54 +1,284 @@
-from evaluators.model_evaluator import generate_build_files
+"""
+KMPEval command line:
+
+    python main.py generate [--case PATH | --all-cases | --batch] [--samples K]   generate build files with the model and score them
+    python main.py score    [--case PATH [--generated PATH] | --all-cases]         score existing generated/ outputs
+    python main.py validate [--case PATH [--generated PATH] | --all-cases]         tier-0 static validation
+    python main.py assemble [--case PATH [--generated PATH] | --all-cases]         Gradle build of generated projects
+    python main.py report   [--compare [BASE HEAD]]                                stored runs and run-over-run regressions
+    python main.py merge    [--queue PATH]                                         one report from the shards of a sharded run
+
+Without a command, generate is run. Evaluator modules are imported inside each command, so scoring,
+validation and reports start without loading the model SDK.
+"""
+import argparse
 import os
-from config.constants import GOLDEN_DATASET_PATH, GENERATED_OUTPUT_PATH
-from evaluators.model_evaluator import compare_results
-from evaluators.project_assembler import assemble_project, assemble_project_stub
+import sys
+import time
+
+from config.constants import (GOLDEN_DATASET_PATH, DATASET_ROOT_PATH, MODEL_BACKEND, REPLAY_LATENCY_SECONDS, SHARD_QUEUE_PATH)
+from util.instrumentation import configure as configure_instrumentation
+
+COMMANDS = ("generate", "score", "validate", "assemble", "report", "merge")
+
+
+def exit_status(results):
+    """0 when at least one case was generated and scored, 1 when there were no cases or all of them failed."""
+    return 0 if any(result["status"] == "ok" for result in results) else 1
+
+
+def main(case_path=GOLDEN_DATASET_PATH, generated_path=None, cache_mode=None, stream=None):
+    """Generates and scores a single case; returns its result row {"case", "status", "metrics", "generation"}."""
+    from evaluators.model_evaluator import compare_results, generate_build_files
+    from evaluators.project_assembler import assemble_project_stub
+    from util.folder_helper import save_generated_files
+    from util.instrumentation import finish_run
+    from util.response_cache import evict_cache
+    from util.results_store import record_run
 
+    generated_path = generated_path or os.path.join(case_path, "generated")
+    case_name = os.path.basename(os.path.normpath(case_path))
+
+    evict_cache()
+
+    stats = {}
+    root_build, app_build, settings = generate_build_files(case_path, generated_path, cache_mode=cache_mode, stream=stream, stats=stats)
 
-def main():
-   
-    root_build, app_build, settings = generate_build_files()
-    
     if root_build is None or app_build is None or settings is None:
         print("Cannot generate build files. Interruption.")
-        return
-    
+        result = {"case": case_name, "status": "generation_failed", "metrics": {}, "generation": stats}
+        record_run("single", [result])
+        finish_run()
+        return result
+
     # Дополнительная проверка на пустые файлы
     if not root_build.strip() or not app_build.strip() or not settings.strip():
         print("⚠️ Warning: One or more generated files are empty!")
         print(f"Root build: {len(root_build)} chars, App build: {len(app_build)} chars, Settings: {len(settings)} chars")
-    
+
     # Save generated files
-    with open(os.path.join(GENERATED_OUTPUT_PATH, "build.gradle.kts"), "w", encoding="utf-8") as f:
-        f.write(root_build)
-
-    # Create composeApp directory if it doesn't exist
-    compose_app_dir = os.path.join(GENERATED_OUTPUT_PATH, "composeApp")
-    os.makedirs(compose_app_dir, exist_ok=True)
-    
-    with open(os.path.join(compose_app_dir, "build.gradle.kts"), "w", encoding="utf-8") as f:
-        f.write(app_build)
-        
-    # Save settings.gradle.kts
-    with open(os.path.join(GENERATED_OUTPUT_PATH, "settings.gradle.kts"), "w", encoding="utf-8") as f:
-        f.write(settings)
-        
-    print(f"✅ Generated files saved to {GENERATED_OUTPUT_PATH}")
-        
-    compare_results(GOLDEN_DATASET_PATH, GENERATED_OUTPUT_PATH)
+    save_generated_files(generated_path, root_build, app_build, settings)
+
+    print(f"✅ Generated files saved to {generated_path}")
+
+    result = {"case": case_name, "status": "ok", "metrics": compare_results(case_path, generated_path), "generation": stats}
+    record_run("single", [result])
 
     # Тестируем логику сборки с готовыми файлами
     print("\n" + "="*60)
-    assemble_success = assemble_project_stub(GOLDEN_DATASET_PATH)
+    assemble_success = assemble_project_stub(case_path)
     if assemble_success:
         print("🎉 Assembly logic works with golden files!")
     else:
         print("❌ Assembly logic needs fixes")
-        
-    # Сборка сгенерированных файлов отключена
-    # assemble_project(GENERATED_OUTPUT_PATH)
+
+    # Сборка сгенерированных файлов отключена, см. main.py assemble
     print("\nGenerated files assembly skipped - focusing on golden file validation.")
+    finish_run()
+    return result
+
+
+def selected_cases(args):
+    """(dataset root, case folders) of a multi-case run: every case of --dataset with --all-cases, otherwise only --case."""
+    if args.all_cases:
+        return args.dataset, None
+    return os.path.dirname(os.path.normpath(args.case)), [args.case]
+
+
+def generate_command(args):
+    from util.model_backends import create_backend, set_backend
+
+    if args.backend or args.replay_latency is not None or args.replay_stub:
+        fallback = None
+        if args.replay_stub:
+            with open(args.replay_stub, "r", encoding="utf-8") as f:
+                fallback = f.read()
+        set_backend(create_backend(args.backend or MODEL_BACKEND, latency=REPLAY_LATENCY_SECONDS if args.replay_latency is None else args.replay_latency, fallback=fallback))
+
+    if args.shard:
+        from evaluators.shard_runner import parse_shard, run_shard_worker
+        if args.samples or args.batch:
+            print("❌ --shard runs the corpus evaluation and cannot be combined with --samples or --batch")
+            return 2
+        try:
+            results = run_shard_worker(parse_shard(args.shard), args.queue, args.dataset, steal=not args.no_steal, max_workers=args.workers,
+                                       max_inflight_requests=args.max_inflight, cache_mode=args.cache_mode, stream=args.stream,
+                                       assemble=args.assemble)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 2
+        # A worker that found every case already claimed by others has nothing to fail
+        return exit_status(results) if results else 0
+    if args.samples:
+        from evaluators.sampling import run_pass_at_k
+        dataset, cases = selected_cases(args)
+        results = run_pass_at_k(dataset, k=args.samples, max_workers=args.workers, max_inflight_requests=args.max_inflight,
+                                cache_mode=args.cache_mode, early_stop=args.early_stop, assemble=args.assemble, cases=cases)
+        return 0 if any(sample["generated"] for result in results for sample in result["samples"]) else 1
+    if args.batch:
+        from evaluators.batch_runner import run_batch
+        dataset, cases = selected_cases(args)
+        return exit_status(run_batch(dataset, cache_mode=args.cache_mode, cases=cases))
+    if args.all_cases:
+        from evaluators.corpus_runner import run_corpus
+        return exit_status(run_corpus(args.dataset, max_workers=args.workers, max_inflight_requests=args.max_inflight,
+                                      cache_mode=args.cache_mode, stream=args.stream, assemble=args.assemble))
+    return exit_status([main(args.case, args.generated, cache_mode=args.cache_mode, stream=args.stream)])
+
+
+def score_command(args):
+    if args.all_cases:
+        from evaluators.corpus_runner import rescore_corpus
+        return exit_status(rescore_corpus(args.dataset, assemble=args.assemble))
+
+    from evaluators.artifact_scoring import print_results_table, score_case
+    from util.instrumentation import finish_run
+    from util.results_store import record_run
+
+    generated_path = args.generated or os.path.join(args.case, "generated")
+    if not os.path.isdir(generated_path):
+        print(f"❌ No generated output in {generated_path}")
+        return 1
+
+    case_name = os.path.basename(os.path.normpath(args.case))
+    metrics = score_case(args.case, generated_path)
+    print_results_table([(case_name, metrics)])
+    record_run("score", [{"case": case_name, "status": "ok", "metrics": metrics}])
+    finish_run()
+    return 0
+
+
+def validate_command(args):
+    from evaluators.corpus_runner import validate_case_output
+    from evaluators.static_validator import print_validation_report
+    from util.folder_helper import find_dataset_cases
+
+    if args.all_cases:
+        cases = [case_path for case_path in find_dataset_cases(args.dataset) if os.path.isdir(os.path.join(case_path, "generated"))]
+        validations = [(os.path.basename(case_path), validate_case_output(case_path)) for case_path in cases]
+    else:
+        validations = [(os.path.basename(os.path.normpath(args.case)), validate_case_output(args.case, args.generated))]
+
+    print_validation_report(validations)
+    return 0 if validations and all(validation["passed"] for _, validation in validations) else 1
+
+
+def assemble_command(args):
+    from evaluators.project_assembler import assemble_project, assemble_project_stub, assemble_projects
+    from util.folder_helper import find_dataset_cases
+
+    if args.stub:
+        return 0 if assemble_project_stub(args.case) else 1
+
+    if args.all_cases:
+        cases = [case_path for case_path in find_dataset_cases(args.dataset) if os.path.isdir(os.path.join(case_path, "generated"))]
+        results = assemble_projects(cases)
+    else:
+        results = [assemble_project(args.generated or os.path.join(args.case, "generated"), args.case)]
+
+    for result in results:
+        print(f"{'✅' if result['success'] else '❌'} {result['case']}: {result['status']} in {result['duration']:.1f}s"
+              + (f" - {result['first_error']}" if result["first_error"] else ""))
+    return 0 if results and all(result["success"] for result in results) else 1
+
+
+def report_command(args):
+    from util.results_store import compare_runs, list_runs
+
+    if args.compare is None:
+        for run_id, started_at, mode, model, commit_sha in list_runs(limit=args.limit):
+            print(f"{run_id}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(started_at))}  {mode:<8} {model}  {commit_sha or ''}")
+        return 0
+
+    if len(args.compare) not in (0, 2):
+        print("❌ --compare takes either no run ids or BASE HEAD")
+        return 2
+    comparison = compare_runs(*args.compare)
+    return 1 if any(row["regression"] for row in comparison) else 0
+
+
+def merge_command(args):
+    from evaluators.shard_runner import merge_shards
+
+    results = merge_shards(args.queue, args.dataset)
+    return 0 if results and all(r["status"] == "ok" for r in results) else 1
+
+
+def add_case_arguments(parser, generated_help="Generated output folder (default: <case>/generated)"):
+    parser.add_argument("--case", default=GOLDEN_DATASET_PATH, help="Case folder with input_codebase and golden_output")
+    parser.add_argument("--generated", default=None, help=generated_help)
+    parser.add_argument("--all-cases", action="store_true", help="Every case of the dataset instead of a single one")
+    parser.add_argument("--dataset", default=DATASET_ROOT_PATH, help="Dataset root used with --all-cases")
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--trace", default=None, help="Path of the JSON trace with stage timings and counters")
+    common.add_argument("--profile", default=None, metavar="STAGES",
+                        help="Comma-separated stages to profile: scan, render, cache, api, parse, metrics, validate")
+    common.add_argument("--profiler", choices=["cprofile", "pyinstrument"], default=None, help="Profiler used for --profile")
+
+    parser = argparse.ArgumentParser(description="KMP build files generation evaluator")
+    commands = parser.add_subparsers(dest="command")
+
+    generate = commands.add_parser("generate", parents=[common], help="Generate build files with the model and score them")
+    add_case_arguments(generate, "Folder the generated files are written to (default: <case>/generated)")
+    generate.add_argument("--batch", action="store_true", help="Evaluate the case (every case with --all-cases) through one Message Batches API request "
+                               "(answered offline with --backend replay)")
+    generate.add_argument("--samples", type=int, default=None, help="Draw this many samples of the case (of every case with --all-cases) and report pass@k")
+    generate.add_argument("--early-stop", action="store_true", help="With --samples, stop drawing samples for a case once one passes")
+    generate.add_argument("--workers", type=int, default=None, help="Number of cases evaluated in parallel")
+    generate.add_argument("--max-inflight", type=int, default=None, help="Maximum number of concurrent model requests")
+    generate.add_argument("--cache-mode", choices=["read-through", "refresh", "offline", "off"], default=None,
+                          help="Model response cache mode (defaults to KMPEVAL_CACHE_MODE or read-through)")
+    generate.add_argument("--assemble", action="store_true", help="Build generated projects with Gradle (with --all-cases or --samples)")
+    generate.add_argument("--stream", action="store_true", default=None,
+                          help="Stream model responses and write each file as soon as it is complete")
+    generate.add_argument("--backend", choices=["live", "record", "replay"], default=None,
+                          help="Model backend (defaults to KMPEVAL_BACKEND or live); replay needs no network or API key")
+    generate.add_argument("--replay-latency", type=float, default=None, help="Simulated seconds per replayed response")
+    generate.add_argument("--replay-stub", default=None, metavar="FILE",
+                          help="With --backend replay, answer requests without a recording with the response in FILE")
+    generate.add_argument("--shard", default=None, metavar="I/N",
+                          help="Evaluate shard I of N of the dataset (implies --all-cases); results go to --queue, see the merge command")
+    generate.add_argument("--queue", default=SHARD_QUEUE_PATH, help="Shared work queue folder of a sharded run (one per run)")
+    generate.add_argument("--no-steal", action="store_true", help="With --shard, do not take over unclaimed cases of other shards")
+    generate.set_defaults(handler=generate_command)
+
+    score = commands.add_parser("score", parents=[common], help="Score existing generated outputs against the golden files")
+    add_case_arguments(score)
+    score.add_argument("--assemble", action="store_true", help="With --all-cases, also build the generated projects with Gradle")
+    score.set_defaults(handler=score_command)
+
+    validate = commands.add_parser("validate", parents=[common], help="Tier-0 static validation of generated outputs")
+    add_case_arguments(validate)
+    validate.set_defaults(handler=validate_command)
+
+    assemble = commands.add_parser("assemble", parents=[common], help="Build generated projects with Gradle")
+    add_case_arguments(assemble)
+    assemble.add_argument("--stub", action="store_true", help="Check the assembly logic with the golden files instead")
+    assemble.set_defaults(handler=assemble_command)
+
+    report = commands.add_parser("report", parents=[common], help="List stored runs or compare two of them")
+    report.add_argument("--compare", nargs="*", metavar="RUN_ID",
+                        help="Compare two stored runs (BASE HEAD, default: the two most recent); exits with 1 on significant regressions")
+    report.add_argument("--limit", type=int, default=20, help="Number of runs listed")
+    report.set_defaults(handler=report_command)
+
+    merge = commands.add_parser("merge", parents=[common], help="Combine the shard results of a sharded run into one report and stored run")
+    merge.add_argument("--queue", default=SHARD_QUEUE_PATH, help="Shared work queue folder the shard workers wrote to")
+    merge.add_argument("--dataset", default=DATASET_ROOT_PATH, help="Dataset root, used to report cases no worker evaluated")
+    merge.set_defaults(handler=merge_command)
+
+    return parser
 
 
 if __name__ == "__main__":
-    main()
+    argv = sys.argv[1:]
+    # Plain "python main.py [options]" keeps generating, as before the subcommands
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv = ["generate"] + argv
+
+    args = build_parser().parse_args(argv)
+    configure_instrumentation(args.trace, args.profile.split(",") if args.profile else None, args.profiler)
+    sys.exit(args.handler(args))
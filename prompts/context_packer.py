@@ -0,0 +1,114 @@
+import math
+import os
+import re
+
+from config.constants import CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARIZE_LOW_PRIORITY, FILE_INDEX_PATH
+from util.folder_helper import iter_relevant_files
+
+# Rough chars-per-token ratio for source code; conservative so the budget is not overshot
+CHARS_PER_TOKEN = 3
+
+BUILD_FILE_EXTENSIONS = {'.gradle', '.toml', '.properties'}
+SOURCE_FILE_EXTENSIONS = {'.kt', '.kts', '.java'}
+
+KOTLIN_SUMMARY_PATTERN = re.compile(
+    r'^\s*(?:package\s|import\s|(?:(?:public|internal|private|protected|expect|actual|data|sealed|abstract|open|'
+    r'enum|annotation|inline|value|override|suspend|const)\s+)*(?:class|interface|object|fun|val|var|typealias)\b)'
+)
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def file_priority(relative_path):
+    """Relevance of a file for build generation, lower is more important."""
+    name = os.path.basename(relative_path)
+    extension = os.path.splitext(name)[1].lower()
+    parts = relative_path.split('/')
+
+    if name.endswith('.gradle.kts') or extension in BUILD_FILE_EXTENSIONS:
+        return 0
+    if 'res' in parts or 'composeResources' in parts:
+        return 4
+    if extension in SOURCE_FILE_EXTENSIONS:
+        # Imports in sources tell which dependencies are needed
+        return 1
+    if name == 'AndroidManifest.xml':
+        return 2
+    return 3
+
+
+def summarize_file(relative_path, content):
+    """Keeps only package, import and declaration lines of Kotlin/Java sources; other files are reduced to a line count."""
+    if os.path.splitext(relative_path)[1].lower() in SOURCE_FILE_EXTENSIONS:
+        lines = []
+        for line in content.splitlines():
+            if KOTLIN_SUMMARY_PATTERN.match(line):
+                lines.append(line.split('{')[0].split(' = ')[0].rstrip())
+        return "\n".join(lines)
+    return f"({len(content.splitlines())} lines omitted)"
+
+
+def pack_source_pieces(files, token_budget=CONTEXT_TOKEN_BUDGET, summarize=CONTEXT_SUMMARIZE_LOW_PRIORITY):
+    """Packs (relative_path, content) pairs into the token budget, most relevant files first.
+
+    Files that do not fit are replaced by a summary if it fits, or dropped otherwise. The result only
+    depends on the input files, so identical codebases always produce identical prompts.
+    Returns (pieces, report): the per-file prompt sections in scan order, and a report listing included,
+    summarized and dropped paths.
+    """
+    files = list(files)
+    ranked = sorted(files, key=lambda item: (file_priority(item[0]), item[0]))
+
+    pieces = {}
+    report = {"included": [], "summarized": [], "dropped": [], "tokens": 0}
+    used = 0
+
+    for relative_path, content in ranked:
+        piece = f"// --- FILE: {relative_path} ---\n\n{content}"
+        cost = estimate_tokens(piece)
+
+        if token_budget is None or used + cost <= token_budget:
+            pieces[relative_path] = piece
+            report["included"].append(relative_path)
+            used += cost
+            continue
+
+        if summarize:
+            piece = f"// --- FILE (summary): {relative_path} ---\n\n{summarize_file(relative_path, content)}"
+            cost = estimate_tokens(piece)
+            if used + cost <= token_budget:
+                pieces[relative_path] = piece
+                report["summarized"].append(relative_path)
+                used += cost
+                continue
+
+        report["dropped"].append(relative_path)
+
+    report["tokens"] = used
+    # Keep the scan order in the prompt
+    return [pieces[path] for path, _ in files if path in pieces], report
+
+
+def pack_codebase_context(codebase_path, token_budget=CONTEXT_TOKEN_BUDGET, summarize=CONTEXT_SUMMARIZE_LOW_PRIORITY, index_dir=FILE_INDEX_PATH):
+    """Scans the codebase and packs it into the token budget, printing which files were summarized or dropped.
+
+    Returns (pieces, report), see pack_source_pieces; render_prompt() turns the pieces into the prompt without joining them first.
+    """
+    print(f"🔎 Looking for all relevant files in {codebase_path}...")
+
+    files = list(iter_relevant_files(codebase_path, index_dir))
+    if not files:
+        print(f"❌ Error: No text files found in {codebase_path}")
+        return None, None
+
+    pieces, report = pack_source_pieces(files, token_budget, summarize)
+
+    print(f"✅ Packed {len(report['included'])}/{len(files)} file(s), ~{report['tokens']} tokens (budget {token_budget})")
+    if report["summarized"]:
+        print(f"  ✂️ Summarized: {', '.join(report['summarized'])}")
+    if report["dropped"]:
+        print(f"  ⚠️ Dropped: {', '.join(report['dropped'])}")
+
+    return pieces, report
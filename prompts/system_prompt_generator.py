@@ -1,15 +1,16 @@
-def generate_system_prompt(source_code):
-    return f"""You are an expert in Kotlin Multiplatform projects.
+# Ends the stable part of the prompt. Everything before it (instructions, output format and the codebase) is the same
+# for every request of a case and is sent as a cacheable prefix; only the short suffix after it varies.
+PREFIX_END_MARKER = "[END_OF_PROJECT_FILES]"
+
+PROMPT_SUFFIX = "Now generate the four build files for the project above, in the required format."
+
+
+PROMPT_HEADER = """You are an expert in Kotlin Multiplatform projects.
     Based on all the following project files, generate the necessary build files: root build.gradle.kts, composeApp build.gradle.kts, settings.gradle.kts, and gradlew.bat.
     Pay close attention to imports in .kt files and dependencies mentioned in other files.
 
-    Combined source code from all relevant project files:
-    ---
-    {source_code}
-    ---
-
     Your response MUST be in the following format, and nothing else:
-    
+
     [ROOT_BUILD_START]
     (content of root build.gradle.kts)
     [ROOT_BUILD_END]
@@ -25,6 +26,40 @@ def generate_system_prompt(source_code):
     [GRADLEW_START]
     (content of gradlew.bat - Windows batch file to run gradle wrapper)
     [GRADLEW_END]
+
+    Combined source code from all relevant project files:
+    ---
     """
-    
-  
\ No newline at end of file
+
+PROMPT_FOOTER = f"""
+    ---
+    {PREFIX_END_MARKER}
+    """
+
+
+def prompt_chunks(pieces, suffix=PROMPT_SUFFIX):
+    """Yields the prompt in order: header, the per-file pieces separated by blank lines, footer and suffix."""
+    yield PROMPT_HEADER
+    for index, piece in enumerate(pieces):
+        if index:
+            yield "\n\n"
+        yield piece
+    yield PROMPT_FOOTER
+    yield suffix
+
+
+def render_prompt(pieces, suffix=PROMPT_SUFFIX):
+    """Renders the prompt straight from the per-file pieces in one join, without an intermediate copy of the whole codebase."""
+    return "".join(prompt_chunks(pieces, suffix))
+
+
+def generate_system_prompt(source_code, suffix=PROMPT_SUFFIX):
+    return render_prompt([source_code], suffix)
+
+
+def split_prompt(prompt):
+    """Splits a rendered prompt into (cacheable prefix, variable suffix); the suffix is None for prompts without the marker."""
+    prefix, marker, suffix = prompt.rpartition(PREFIX_END_MARKER)
+    if not marker:
+        return prompt, None
+    return prefix + marker, suffix.strip()
@@ -0,0 +1,122 @@
+import random
+import sys
+import threading
+import time
+
+from config.constants import ANTHROPIC_API_KEY, API_MAX_RETRIES, API_RETRY_BASE_SECONDS, API_RETRY_MAX_SECONDS, API_TIMEOUT_SECONDS
+
+# 529 is returned when the API is overloaded
+RATE_LIMIT_STATUS_CODES = {429, 529}
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Returns the process-wide Anthropic client, so all cases reuse one HTTP connection pool.
+
+    SDK retries are disabled because call_with_retries handles them together with the concurrency limiter.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Imported here: the SDK takes longer to import than scoring a case, and only generation needs it
+            import anthropic
+            _client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0, timeout=API_TIMEOUT_SECONDS)
+        return _client
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits in-flight requests and tunes the limit AIMD-style.
+
+    Every successful call raises the limit by 1/limit (about +1 per full window), every rate-limit
+    response halves it. Decreases closer together than one retry base delay count as one overload event.
+    """
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_rate_limit(self):
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease < API_RETRY_BASE_SECONDS:
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit / 2)
+            print(f"🐢 Rate limited, concurrency limit lowered to {int(self.limit)}")
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error):
+    # Without a client the SDK was never imported, so the error cannot be one of its exceptions
+    anthropic = sys.modules.get("anthropic")
+    if anthropic is not None and isinstance(error, (anthropic.APITimeoutError, anthropic.APIConnectionError)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before the next attempt: the server's retry-after if given, otherwise full-jitter exponential backoff."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), API_RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(API_RETRY_MAX_SECONDS, API_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def call_with_retries(call, limiter=None, max_retries=API_MAX_RETRIES):
+    """Runs call() inside a limiter slot, retrying rate limits, overloads, timeouts and 5xx errors."""
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            result = call()
+        except Exception as e:
+            if limiter is not None:
+                limiter.release()
+                if _status_code(e) in RATE_LIMIT_STATUS_CODES:
+                    limiter.on_rate_limit()
+
+            if not is_retryable(e) or attempt >= max_retries:
+                raise
+
+            delay = retry_delay(e, attempt)
+            attempt += 1
+            print(f"🔁 {type(e).__name__}, retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if limiter is not None:
+            limiter.release()
+            limiter.on_success()
+        return result
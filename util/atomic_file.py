@@ -0,0 +1,23 @@
+import json
+import os
+import tempfile
+
+
+def write_json_atomic(path, data, indent=None):
+    """Writes JSON to a unique temporary file next to path, then renames it into place.
+
+    mkstemp gives every writer its own temporary file, so threads and processes writing the same path concurrently
+    never rename each other's file away; readers see either the old or the new complete file.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
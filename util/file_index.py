@@ -0,0 +1,135 @@
+import hashlib
+import json
+import mmap
+import os
+
+from config.constants import FILE_INDEX_PATH, MAX_SOURCE_FILE_BYTES, GENERATED_SOURCE_MAX_BYTES
+from util.atomic_file import write_json_atomic
+
+# Size of the file prefix inspected to tell binary files from text
+BINARY_SNIFF_BYTES = 8192
+
+# Header comments of generated sources, looked for in the first block of a file
+GENERATED_SOURCE_MARKERS = (b"@generated", b"Code generated", b"DO NOT EDIT", b"Automatically generated")
+
+
+def is_binary_data(data):
+    """Cheap binary sniff: text files never contain NUL bytes in their first block."""
+    return b"\0" in data[:BINARY_SNIFF_BYTES]
+
+
+def is_generated_data(data):
+    head = data[:BINARY_SNIFF_BYTES]
+    return any(marker in head for marker in GENERATED_SOURCE_MARKERS)
+
+
+def read_capped(file_path, max_bytes, digest=False):
+    """Returns (first max_bytes bytes of the file, sha256 of the whole file or None).
+
+    To hash, the file is memory-mapped, so a large file is never held in memory and only the returned prefix is copied.
+    """
+    with open(file_path, "rb") as f:
+        if not digest:
+            return f.read(max_bytes), None
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            return b"", hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:max_bytes], hashlib.sha256(mapped).hexdigest()
+
+
+def decode_text(data, truncated=False):
+    """Decodes UTF-8 with the newline handling of text mode; a character cut by truncation is dropped.
+    Raises UnicodeDecodeError for data that is not UTF-8 text."""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if not truncated or e.reason != "unexpected end of data":
+            raise
+        text = data[:e.start].decode("utf-8")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_text_file(file_path, max_bytes):
+    """Reads at most max_bytes of a UTF-8 text file, e.g. a golden or generated build file to score."""
+    data, _ = read_capped(file_path, max_bytes)
+    return decode_text(data, truncated=len(data) == max_bytes)
+
+
+def source_text(data, size, generated):
+    """Text of a source file from its first bytes; truncated text ends with a note giving the full size.
+    Raises UnicodeDecodeError for data that is not UTF-8 text."""
+    truncated = len(data) < size
+    text = decode_text(data, truncated)
+    if truncated:
+        kind = "generated source" if generated else "file"
+        text += f"\n// ... {kind} truncated: first {len(data)} of {size} bytes shown\n"
+    return text
+
+
+def index_file(file_path, stat, generated=False, max_bytes=MAX_SOURCE_FILE_BYTES, generated_max_bytes=GENERATED_SOURCE_MAX_BYTES):
+    """Reads a file once and returns (index entry, text or None for binary files).
+
+    The entry holds size, mtime, content hash, the binary and generated flags and the size caps, but not the text, so
+    the index stays small; see load_indexed_text. Only the first max_bytes of the text are used, and only
+    generated_max_bytes of generated sources (generated=True for files from generated folders, or files with a
+    generated-code header), so one huge file cannot blow up the prompt.
+    """
+    data, digest = read_capped(file_path, max_bytes, digest=True)
+    if generated or is_generated_data(data):
+        generated = True
+        data = data[:generated_max_bytes]
+
+    entry = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+        "binary": is_binary_data(data),
+        "generated": generated,
+        "max_bytes": max_bytes,
+        "generated_max_bytes": generated_max_bytes,
+    }
+
+    text = None
+    if not entry["binary"]:
+        try:
+            text = source_text(data, stat.st_size, generated)
+        except UnicodeDecodeError:
+            entry["binary"] = True
+    return entry, text
+
+
+def is_current(entry, stat, max_bytes=MAX_SOURCE_FILE_BYTES, generated_max_bytes=GENERATED_SOURCE_MAX_BYTES):
+    """True when an index entry still describes the file: same size and mtime, indexed with the same caps."""
+    # Entries without the generated flag come from indexes that stored the text itself
+    return (entry is not None and "generated" in entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["max_bytes"] == max_bytes and entry["generated_max_bytes"] == generated_max_bytes)
+
+
+def load_indexed_text(file_path, entry):
+    """Reads the text of an unchanged text file with the caps it was indexed with, skipping the hash and sniffing."""
+    max_bytes = min(entry["max_bytes"], entry["generated_max_bytes"]) if entry["generated"] else entry["max_bytes"]
+    data, _ = read_capped(file_path, max_bytes)
+    return source_text(data, entry["size"], entry["generated"])
+
+
+def _index_path(codebase_path, index_dir):
+    name = hashlib.sha1(os.path.abspath(codebase_path).encode("utf-8")).hexdigest()
+    return os.path.join(index_dir, f"{name}.json")
+
+
+def load_file_index(codebase_path, index_dir=FILE_INDEX_PATH):
+    """Returns the stored index of a codebase as {relative_path: entry}, or an empty dict."""
+    try:
+        with open(_index_path(codebase_path, index_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_file_index(codebase_path, entries, index_dir=FILE_INDEX_PATH):
+    """Writes the index atomically so parallel scans of the same codebase never see a partial file."""
+    path = _index_path(codebase_path, index_dir)
+    os.makedirs(index_dir, exist_ok=True)
+
+    write_json_atomic(path, entries)
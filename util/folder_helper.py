@@ -1,51 +1,138 @@
 import os
 import shutil
 
+from config.constants import FILE_INDEX_PATH
+from util.file_index import index_file, is_current, load_file_index, load_indexed_text, save_file_index
+from util.instrumentation import count
+
 def ensure_directory_exists(path):
     if os.path.exists(path):
         shutil.rmtree(path)
     os.makedirs(path)
 
 
-def find_relevant_files_in_codebase(codebase_path):
-    """Reading all relevant source code files from the codebase, ignoring binary and unnecessary files."""
+def find_dataset_cases(dataset_root):
+    """Returns paths of all cases in the dataset (folders containing input_codebase), sorted by name."""
+    cases = []
+    for name in sorted(os.listdir(dataset_root)):
+        case_path = os.path.join(dataset_root, name)
+        if os.path.isdir(os.path.join(case_path, "input_codebase")):
+            cases.append(case_path)
+    return cases
 
-    # 1. Recursively read all files, ignoring unnecessary ones
-    all_source_code = []
 
-    # Lists for ignoring "garbage"
-    ignored_dirs = {'build', '.gradle', '.idea', 'gradle'}
-    ignored_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.jar', '.zip', '.bin'}
+def save_generated_files(generated_path, root_build, app_build, settings):
+    """Writes generated build files into the case output folder."""
+    os.makedirs(generated_path, exist_ok=True)
 
-    print(f"🔎 Looking for all relevant files in {codebase_path}...")
+    with open(os.path.join(generated_path, "build.gradle.kts"), "w", encoding="utf-8") as f:
+        f.write(root_build)
+
+    # Create composeApp directory if it doesn't exist
+    compose_app_dir = os.path.join(generated_path, "composeApp")
+    os.makedirs(compose_app_dir, exist_ok=True)
+
+    with open(os.path.join(compose_app_dir, "build.gradle.kts"), "w", encoding="utf-8") as f:
+        f.write(app_build)
+
+    with open(os.path.join(generated_path, "settings.gradle.kts"), "w", encoding="utf-8") as f:
+        f.write(settings)
+
+
+def save_generated_section(generated_path, relative_path, content):
+    """Writes a single generated file, creating its parent folders."""
+    file_path = os.path.join(generated_path, *relative_path.split('/'))
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+# Lists for ignoring "garbage"
+IGNORED_DIRS = {'build', '.gradle', '.idea', 'gradle'}
+IGNORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.jar', '.zip', '.bin'}
+
+# Generated sources are kept in the prompt, but truncated to a short preview
+GENERATED_DIRS = {'generated', 'kotlin-js-store'}
+GENERATED_FILE_SUFFIXES = ('.lock', '-lock.json', '.min.js', '.generated.kt')
+
+
+def is_generated_source(relative_path):
+    parts = relative_path.split('/')
+    return any(part in GENERATED_DIRS for part in parts[:-1]) or parts[-1].endswith(GENERATED_FILE_SUFFIXES)
+
+
+def iter_relevant_files(codebase_path, index_dir=FILE_INDEX_PATH):
+    """Yields (relative_path, content) for every relevant text file in a stable order.
+
+    Files whose size and mtime match the persistent index, indexed with the current size caps, are not hashed or
+    sniffed again: binary files are skipped unread and text is read one file at a time as it is yielded.
+    Contents are capped at MAX_SOURCE_FILE_BYTES, see util.file_index.index_file.
+    """
+    index = load_file_index(codebase_path, index_dir)
+    entries = {}
+    changed = False
 
     for root, dirs, files in os.walk(codebase_path):
         # Exclude service folders from further traversal
-        dirs[:] = [d for d in dirs if d not in ignored_dirs]
-        
-        for file in files:
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+
+        for file in sorted(files):
             # Check file extension
-            if any(file.endswith(ext) for ext in ignored_extensions):
+            if os.path.splitext(file)[1].lower() in IGNORED_EXTENSIONS:
                 continue # Skip binary/unnecessary files
 
             file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, codebase_path)
-            
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                    all_source_code.append(f"// --- FILE: {relative_path.replace(os.sep, '/')} ---\n\n{content}")
-            except UnicodeDecodeError:
+            relative_path = os.path.relpath(file_path, codebase_path).replace(os.sep, '/')
+
+            stat = os.stat(file_path)
+            entry = index.get(relative_path)
+            content = None
+            if not is_current(entry, stat):
+                entry, content = index_file(file_path, stat, is_generated_source(relative_path))
+                changed = True
+                count("bytes_read", stat.st_size)
+            entries[relative_path] = entry
+            count("files_scanned")
+            count("bytes_scanned", stat.st_size)
+
+            if entry["binary"]:
                 # If the file could not be read as text, skip it
                 print(f"  ⚠️ Skipped binary or non-text file: {relative_path}")
                 continue
 
-    if not all_source_code:
+            if content is None:
+                content = load_indexed_text(file_path, entry)
+            yield relative_path, content
+
+    if changed or len(entries) != len(index):
+        save_file_index(codebase_path, entries, index_dir)
+
+
+def iter_prompt_pieces(codebase_path, index_dir=FILE_INDEX_PATH):
+    """Streams the per-file prompt sections of a codebase."""
+    for relative_path, content in iter_relevant_files(codebase_path, index_dir):
+        yield f"// --- FILE: {relative_path} ---\n\n{content}"
+
+
+def find_relevant_files_in_codebase(codebase_path, index_dir=FILE_INDEX_PATH):
+    """Reading all relevant source code files from the codebase, ignoring binary and unnecessary files."""
+
+    print(f"🔎 Looking for all relevant files in {codebase_path}...")
+
+    file_count = 0
+
+    def counted(pieces):
+        nonlocal file_count
+        for piece in pieces:
+            file_count += 1
+            yield piece
+
+    source_code = "\n\n".join(counted(iter_prompt_pieces(codebase_path, index_dir)))
+
+    if not file_count:
         print(f"❌ Error: No text files found in {codebase_path}")
-        return None, None
+        return None
 
-    print(f"✅ Found {len(all_source_code)} relevant file(s).")
+    print(f"✅ Found {file_count} relevant file(s).")
     
-    return "\n\n".join(all_source_code)
-    
\ No newline at end of file
+    return source_code
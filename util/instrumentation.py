@@ -0,0 +1,186 @@
+"""
+Lightweight pipeline instrumentation: timed spans per stage (scan, render, cache, api, first_token, parse, metrics,
+validate, gradle), counters (tokens, prompt cache tokens, bytes scanned, cache hits), a JSON trace file and p50/p95 per stage.
+
+Stages listed in PROFILE_STAGES (or passed to configure) are additionally run under cProfile (or pyinstrument, if selected and
+installed) and their profiles are written next to the trace.
+"""
+import cProfile
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from config.constants import TRACE_PATH, PROFILE_STAGES, PROFILER
+from util.lazy_imports import optional_module
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = []
+_counters = {}
+_profile_count = 0
+_settings = {"trace_path": TRACE_PATH, "profile_stages": set(PROFILE_STAGES), "profiler": PROFILER}
+
+
+def configure(trace_path=None, profile_stages=None, profiler=None):
+    """Overrides the trace path, the profiled stages and the profiler ("cprofile" or "pyinstrument")."""
+    if trace_path:
+        _settings["trace_path"] = trace_path
+    if profile_stages is not None:
+        _settings["profile_stages"] = set(profile_stages)
+    if profiler:
+        _settings["profiler"] = profiler
+
+
+def set_case(case_name):
+    """Labels the spans of the current thread with a case (or case/sample) name."""
+    _local.case = case_name
+
+
+def current_case():
+    return getattr(_local, "case", None)
+
+
+def count(name, value=1):
+    """Adds value to a run-wide counter, e.g. input_tokens, bytes_scanned or cache_hits."""
+    if value is None:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def record_span(stage, duration, **attrs):
+    """Records a span whose duration was measured elsewhere (e.g. in a worker process)."""
+    with _lock:
+        _spans.append({"stage": stage, "case": current_case(), "start": time.time() - duration, "duration": duration, **attrs})
+
+
+def _profile_path(stage, extension):
+    global _profile_count
+    with _lock:
+        _profile_count += 1
+        number = _profile_count
+    directory = os.path.join(os.path.dirname(os.path.abspath(_settings["trace_path"])), "profiles")
+    os.makedirs(directory, exist_ok=True)
+    label = (current_case() or "run").replace("/", "_")
+    return os.path.join(directory, f"{stage}_{label}_{number}.{extension}")
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Times the enclosed block as one span of the given stage."""
+    profiler = None
+    if stage in _settings["profile_stages"]:
+        pyinstrument = optional_module("pyinstrument") if _settings["profiler"] == "pyinstrument" else None
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        duration = time.perf_counter() - started
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(_profile_path(stage, "prof"))
+        elif profiler is not None:
+            profiler.stop()
+            with open(_profile_path(stage, "html"), "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        record_span(stage, duration, **attrs)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+def stage_summary():
+    """Returns {stage: {"count", "total", "p50", "p95", "max"}} over all recorded spans."""
+    with _lock:
+        durations = {}
+        for recorded in _spans:
+            durations.setdefault(recorded["stage"], []).append(recorded["duration"])
+
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {"count": len(values), "total": sum(values), "p50": percentile(values, 0.5),
+                          "p95": percentile(values, 0.95), "max": values[-1]}
+    return summary
+
+
+def cache_hit_rate():
+    hits, misses = _counters.get("cache_hits", 0), _counters.get("cache_misses", 0)
+    return hits / (hits + misses) if hits + misses else None
+
+
+def write_trace(path=None):
+    """Writes all spans, counters and the stage summary as JSON."""
+    path = path or _settings["trace_path"]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _lock:
+        trace = {"spans": list(_spans), "counters": dict(_counters)}
+    trace["summary"] = stage_summary()
+    trace["cache_hit_rate"] = cache_hit_rate()
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, indent=1)
+    return path
+
+
+def load_trace(path):
+    """Adds the spans and counters of a trace written by another process (e.g. a shard worker) to this run."""
+    with open(path, "r", encoding="utf-8") as f:
+        trace = json.load(f)
+    with _lock:
+        _spans.extend(trace["spans"])
+        for name, value in trace["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def reset():
+    global _profile_count
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _profile_count = 0
+
+
+def print_stage_summary():
+    summary = stage_summary()
+    if not summary:
+        return
+
+    print("\n⏱️ Stage timings (seconds)")
+    print(f"{'stage':<12}  {'count':>5}  {'total':>9}  {'p50':>8}  {'p95':>8}  {'max':>8}")
+    for stage, stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+        print(f"{stage:<12}  {stats['count']:>5}  {stats['total']:>9.3f}  {stats['p50']:>8.3f}  {stats['p95']:>8.3f}  {stats['max']:>8.3f}")
+
+    with _lock:
+        counters = dict(_counters)
+    if counters:
+        print("   " + ", ".join(f"{name}={value:,}" if isinstance(value, int) else f"{name}={value:.3f}"
+                                for name, value in sorted(counters.items())))
+    rate = cache_hit_rate()
+    if rate is not None:
+        print(f"   cache hit rate: {rate:.0%}")
+
+
+def finish_run(path=None):
+    """Writes the trace file, prints the per-stage summary and starts a fresh trace for the next run."""
+    path = write_trace(path)
+    print_stage_summary()
+    print(f"🧾 Trace written to {path}")
+    reset()
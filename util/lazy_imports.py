@@ -0,0 +1,15 @@
+"""
+Optional third-party modules (NumPy, pyinstrument) imported on first use, so commands that never need them
+start without paying their import time.
+"""
+import importlib
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def optional_module(name):
+    """Returns the imported module, or None when it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
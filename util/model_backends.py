@@ -0,0 +1,186 @@
+"""
+Pluggable model backends. Every backend answers Messages API request parameters with a ModelResponse:
+
+  live   - the Anthropic API through the shared client
+  record - the live API, with every request/response pair also written to RECORDINGS_PATH
+  replay - answers from RECORDINGS_PATH without network or API key, with optional simulated latency;
+           requests that were never recorded get replay_fallback text (a stub response) or fail
+
+Recordings are keyed by a hash of the request parameters. Several recordings of the same request (e.g. samples)
+are served in turn. Only backends with live = True call the model, so only their responses go to the response cache;
+replayed and stub responses never end up where a later live run would read them.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+from config.constants import MODEL_BACKEND, RECORDINGS_PATH, REPLAY_LATENCY_SECONDS
+from util.api_client import get_shared_client
+from util.atomic_file import write_json_atomic
+
+# Prompt cache token counts default to None, so recordings made before prompt caching still load
+ModelResponse = namedtuple("ModelResponse", ["text", "input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens"],
+                           defaults=(None, None))
+
+# Chunk size used when a replayed response is streamed
+REPLAY_CHUNK_SIZE = 64
+
+
+class ReplayMissError(Exception):
+    """Raised by the replay backend for a request that has no recording and no fallback."""
+
+
+def request_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def response_from_usage(text, usage):
+    return ModelResponse(text, getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None),
+                         getattr(usage, "cache_read_input_tokens", None), getattr(usage, "cache_creation_input_tokens", None))
+
+
+class AnthropicBackend:
+    """Live backend: sends requests to the Anthropic API through the shared client."""
+
+    live = True
+
+    def __init__(self, client=None):
+        self.client = client or get_shared_client()
+
+    def complete(self, params):
+        response = self.client.messages.create(**params)
+        text = "".join(block.text for block in response.content if block.type == "text")
+        return response_from_usage(text, getattr(response, "usage", None))
+
+    def stream(self, params, on_text):
+        """Streams the response, handing every text chunk to on_text; returning True from on_text closes the stream."""
+        chunks = []
+        with self.client.messages.stream(**params) as stream:
+            for text in stream.text_stream:
+                chunks.append(text)
+                if on_text(text):
+                    break
+            usage = getattr(getattr(stream, "current_message_snapshot", None), "usage", None)
+        return response_from_usage("".join(chunks), usage)
+
+
+class RecordingBackend:
+    """Wraps another backend and records every request/response pair to disk."""
+
+    def __init__(self, inner, recordings_path=RECORDINGS_PATH):
+        self.inner = inner
+        self.recordings_path = recordings_path
+        self._lock = threading.Lock()
+
+    @property
+    def live(self):
+        return self.inner.live
+
+    def complete(self, params):
+        response = self.inner.complete(params)
+        self.record(params, response)
+        return response
+
+    def stream(self, params, on_text):
+        response = self.inner.stream(params, on_text)
+        self.record(params, response)
+        return response
+
+    def record(self, params, response):
+        os.makedirs(self.recordings_path, exist_ok=True)
+        path = os.path.join(self.recordings_path, f"{request_hash(params)}.json")
+        with self._lock:
+            recording = load_recording(path) or {"params": params, "responses": []}
+            recording["responses"].append(response._asdict())
+            write_json_atomic(path, recording, indent=1)
+
+
+class ReplayBackend:
+    """Serves recorded responses without network access, optionally after a simulated latency."""
+
+    live = False
+
+    def __init__(self, recordings_path=RECORDINGS_PATH, latency=REPLAY_LATENCY_SECONDS, fallback=None):
+        self.recordings_path = recordings_path
+        self.latency = latency
+        self.fallback = fallback
+        self._served = {}
+        self._lock = threading.Lock()
+
+    def _response(self, params):
+        key = request_hash(params)
+        recording = load_recording(os.path.join(self.recordings_path, f"{key}.json"))
+        if not recording or not recording["responses"]:
+            if self.fallback is None:
+                raise ReplayMissError(f"No recording for request {key[:12]} in {self.recordings_path}")
+            return ModelResponse(self.fallback, None, None)
+
+        with self._lock:
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+        return ModelResponse(**recording["responses"][served % len(recording["responses"])])
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            # Up to +/-20% jitter so concurrent replays do not move in lockstep
+            time.sleep(seconds * random.uniform(0.8, 1.2))
+
+    def complete(self, params):
+        response = self._response(params)
+        self._sleep(self.latency)
+        return response
+
+    def stream(self, params, on_text):
+        response = self._response(params)
+        chunks = [response.text[i:i + REPLAY_CHUNK_SIZE] for i in range(0, len(response.text), REPLAY_CHUNK_SIZE)]
+        # Half of the latency is spent before the first chunk, the rest spread over the chunks
+        self._sleep(self.latency / 2)
+        sent = []
+        for chunk in chunks:
+            self._sleep(self.latency / 2 / max(1, len(chunks)))
+            sent.append(chunk)
+            if on_text(chunk):
+                break
+        return response._replace(text="".join(sent))
+
+
+def load_recording(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def create_backend(name=MODEL_BACKEND, recordings_path=RECORDINGS_PATH, latency=REPLAY_LATENCY_SECONDS, fallback=None):
+    """Builds the backend selected by name: "live", "record" or "replay"."""
+    if name == "live":
+        return AnthropicBackend()
+    if name == "record":
+        return RecordingBackend(AnthropicBackend(), recordings_path)
+    if name == "replay":
+        return ReplayBackend(recordings_path, latency, fallback)
+    raise ValueError(f"Unknown model backend: {name}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the process-wide backend, created from MODEL_BACKEND unless set_backend() was called."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
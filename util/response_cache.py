@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import time
+
+from config.constants import RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_AGE_DAYS
+from util.atomic_file import write_json_atomic
+
+
+def cache_key(model_name, max_tokens, temperature, prompt, sample=0):
+    """Content address of a generation request: hash of the model settings and the rendered prompt.
+
+    Sample 0 is the single-generation key; further samples of the same prompt get their own entries.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([model_name, max_tokens, temperature]).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    if sample:
+        digest.update(f"\0sample={sample}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def load_cached_response(key, cache_dir=RESPONSE_CACHE_PATH, max_age_days=RESPONSE_CACHE_MAX_AGE_DAYS):
+    """Returns cached response text for the key, or None if missing or expired."""
+    path = _entry_path(key, cache_dir)
+    try:
+        if max_age_days is not None and time.time() - os.path.getmtime(path) > max_age_days * 86400:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store_cached_response(key, content, model_name, cache_dir=RESPONSE_CACHE_PATH):
+    """Writes the response atomically so concurrent cases never read a half-written entry."""
+    path = _entry_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    write_json_atomic(path, {"model": model_name, "created_at": time.time(), "content": content})
+
+
+def evict_cache(cache_dir=RESPONSE_CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_BYTES, max_age_days=RESPONSE_CACHE_MAX_AGE_DAYS):
+    """Removes expired entries, then the least recently written ones until the cache fits into max_bytes."""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    now = time.time()
+    entries = []
+    removed = 0
+
+    for root, _, files in os.walk(cache_dir):
+        for file in files:
+            path = os.path.join(root, file)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if max_age_days is not None and now - stat.st_mtime > max_age_days * 86400:
+                os.remove(path)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+
+    if removed:
+        print(f"🧹 Evicted {removed} cached response(s) from {cache_dir}")
+    return removed
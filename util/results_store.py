@@ -0,0 +1,211 @@
+import os
+import random
+import sqlite3
+import time
+import uuid
+
+from config.constants import MODEL_NAME, MAX_TOKENS, TEMPERATURE, RESULTS_DB_PATH, REGRESSION_ALPHA, REGRESSION_MIN_DELTA
+
+# Long format: one row per run, case, artifact, metric and sample. Keys lead with run_id, so reading or
+# deleting a run touches only its own pages however many nightly runs the file holds.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    mode TEXT NOT NULL,
+    model TEXT,
+    temperature REAL,
+    max_tokens INTEGER,
+    commit_sha TEXT
+);
+CREATE TABLE IF NOT EXISTS generations (
+    run_id TEXT NOT NULL,
+    case_name TEXT NOT NULL,
+    sample INTEGER NOT NULL,
+    status TEXT,
+    prompt_hash TEXT,
+    cache_hit INTEGER,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    duration REAL,
+    cache_read_tokens INTEGER,
+    cache_write_tokens INTEGER,
+    PRIMARY KEY (run_id, case_name, sample)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL,
+    case_name TEXT NOT NULL,
+    artifact TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    sample INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, case_name, artifact, metric, sample)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (started_at);
+"""
+
+# Generation stats compared between runs; for these (and "missing") lower is better
+GENERATION_METRICS = ["duration", "input_tokens", "output_tokens"]
+LOWER_IS_BETTER = set(GENERATION_METRICS) | {"missing"}
+
+PERMUTATION_ROUNDS = 10000
+
+# Columns added after the first schema version, created on existing databases by connect()
+ADDED_COLUMNS = {"generations": [("cache_read_tokens", "INTEGER"), ("cache_write_tokens", "INTEGER")]}
+
+
+def connect(db_path=RESULTS_DB_PATH):
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+    return conn
+
+
+def _flatten_metrics(metrics):
+    """Yields (artifact, metric, value) from {artifact: {metric: value}} metrics, skipping non-numeric values."""
+    for artifact, artifact_metrics in metrics.items():
+        for metric, value in artifact_metrics.items():
+            if isinstance(value, (int, float)):
+                yield artifact, metric, float(value)
+
+
+def record_run(mode, rows, db_path=RESULTS_DB_PATH):
+    """Stores one run. rows are case results {"case", "status", "metrics", "generation"?, "sample"?}
+    as returned by the corpus, batch and sampling runners. Returns the run id."""
+    run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    commit_sha = os.environ.get("GITHUB_SHA") or os.environ.get("GIT_COMMIT")
+
+    conn = connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (run_id, time.time(), mode, MODEL_NAME, TEMPERATURE, MAX_TOKENS, commit_sha))
+
+        for row in rows:
+            sample = row.get("sample", 0)
+            generation = row.get("generation") or {}
+            conn.execute("INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (run_id, row["case"], sample, row["status"], generation.get("prompt_hash"),
+                          int(generation["cache_hit"]) if "cache_hit" in generation else None,
+                          generation.get("input_tokens"), generation.get("output_tokens"), generation.get("duration"),
+                          generation.get("cache_read_tokens"), generation.get("cache_write_tokens")))
+            conn.executemany("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)",
+                             [(run_id, row["case"], artifact, metric, sample, value)
+                              for artifact, metric, value in _flatten_metrics(row["metrics"])])
+    conn.close()
+
+    print(f"🗄️ Results stored as run {run_id} in {db_path}")
+    return run_id
+
+
+def list_runs(db_path=RESULTS_DB_PATH, limit=20):
+    """Returns the most recent runs as (run_id, started_at, mode, model, commit_sha), newest first."""
+    conn = connect(db_path)
+    rows = conn.execute("SELECT run_id, started_at, mode, model, commit_sha FROM runs ORDER BY started_at DESC LIMIT ?",
+                        (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+def load_case_means(conn, run_id):
+    """Per-case means over samples: {(artifact, metric): {case: value}}, generation stats under artifact "generation"."""
+    means = {}
+    for case_name, artifact, metric, value in conn.execute(
+            "SELECT case_name, artifact, metric, AVG(value) FROM metrics WHERE run_id = ? GROUP BY case_name, artifact, metric",
+            (run_id,)):
+        means.setdefault((artifact, metric), {})[case_name] = value
+
+    columns = ", ".join(f"AVG({name})" for name in GENERATION_METRICS)
+    for case_name, *values in conn.execute(
+            f"SELECT case_name, {columns} FROM generations WHERE run_id = ? GROUP BY case_name", (run_id,)):
+        for name, value in zip(GENERATION_METRICS, values):
+            if value is not None:
+                means.setdefault(("generation", name), {})[case_name] = value
+    return means
+
+
+def sign_flip_p_value(deltas, rounds=PERMUTATION_ROUNDS):
+    """One-sided paired permutation test: probability of a mean delta this low if the sign of every delta were random.
+
+    Exact for up to 12 pairs, Monte Carlo with a fixed seed above that.
+    """
+    n = len(deltas)
+    if n == 0:
+        return 1.0
+    observed = sum(deltas)
+
+    if n <= 12:
+        hits = 0
+        for mask in range(1 << n):
+            total = sum(-d if mask >> i & 1 else d for i, d in enumerate(deltas))
+            hits += total <= observed + 1e-12
+        return hits / (1 << n)
+
+    rng = random.Random(0)
+    hits = sum(sum(d if rng.random() < 0.5 else -d for d in deltas) <= observed + 1e-12 for _ in range(rounds))
+    return (hits + 1) / (rounds + 1)
+
+
+def compare_runs(base_run=None, head_run=None, db_path=RESULTS_DB_PATH, alpha=REGRESSION_ALPHA, min_delta=REGRESSION_MIN_DELTA):
+    """Diffs two runs (default: the two most recent) paired by case and returns the comparison rows.
+
+    A metric is flagged as a regression when it got worse by at least min_delta (relative to the base value
+    when that is above 1, e.g. seconds or tokens) and the paired sign-flip test gives p < alpha.
+    """
+    conn = connect(db_path)
+    if base_run is None or head_run is None:
+        recent = [row[0] for row in conn.execute("SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 2")]
+        if len(recent) < 2:
+            conn.close()
+            print(f"❌ Need two runs in {db_path} to compare")
+            return []
+        head_run = head_run or recent[0]
+        base_run = base_run or recent[1]
+
+    base, head = load_case_means(conn, base_run), load_case_means(conn, head_run)
+    conn.close()
+
+    comparison = []
+    for key in sorted(set(base) & set(head)):
+        cases = sorted(set(base[key]) & set(head[key]))
+        if not cases:
+            continue
+        sign = -1.0 if key[1] in LOWER_IS_BETTER else 1.0
+        # Positive delta is an improvement for every metric
+        deltas = [sign * (head[key][case] - base[key][case]) for case in cases]
+        base_mean = sum(base[key][case] for case in cases) / len(cases)
+        head_mean = sum(head[key][case] for case in cases) / len(cases)
+        mean_delta = sum(deltas) / len(deltas)
+        p_value = sign_flip_p_value(deltas)
+        threshold = min_delta * max(1.0, abs(base_mean))
+        comparison.append({
+            "artifact": key[0], "metric": key[1], "cases": len(cases), "base": base_mean, "head": head_mean,
+            "delta": mean_delta, "p_value": p_value, "regression": mean_delta <= -threshold and p_value < alpha,
+        })
+
+    print_comparison(base_run, head_run, comparison)
+    return comparison
+
+
+def print_comparison(base_run, head_run, comparison):
+    print(f"\n📈 {base_run} → {head_run}")
+    header = f"{'artifact':<32}  {'metric':<28}  {'n':>3}  {'base':>9}  {'head':>9}  {'delta':>9}  {'p':>6}"
+    print(header)
+    print("-" * len(header))
+    for row in comparison:
+        flag = "  ❌ regression" if row["regression"] else ""
+        print(f"{row['artifact']:<32}  {row['metric']:<28}  {row['cases']:>3}  {row['base']:>9.3f}  {row['head']:>9.3f}  "
+              f"{row['delta']:>+9.3f}  {row['p_value']:>6.3f}{flag}")
+
+    regressions = sum(1 for row in comparison if row["regression"])
+    if regressions:
+        print(f"\n❌ {regressions} significant regression(s)")
+    else:
+        print("\n✅ No significant regressions")